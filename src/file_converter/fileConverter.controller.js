@@ -762,14 +762,9 @@ exports.pdfToWord = async (req, res) => {
   try {
     console.log('📕 PDF → WORD (pdf2docx - Professional Quality)');
 
-    const outDir = path.dirname(inPath);
-    const inputFileName = path.basename(inPath);
-    const baseName = path.parse(inputFileName).name;
-    const expectedOutput = path.join(outDir, `${baseName}.docx`);
     const originalBaseName = path.parse(req.file.originalname).name;
 
     console.log('📂 Input file:', inPath);
-    console.log('📂 Expected output:', expectedOutput);
 
     // Platform-specific Python command
     const pythonCmd = (process.platform === 'win32') ? 'python' : 'python3';
@@ -777,41 +772,37 @@ exports.pdfToWord = async (req, res) => {
     // Path to Python script
     const scriptPath = path.join(__dirname, 'pdf_to_word.py');
 
-    // Build command
-    const command = `${pythonCmd} "${scriptPath}" "${inPath}" "${expectedOutput}"`;
-
-    console.log('🔧 Command:', command);
-
-    const { exec } = require('child_process');
-    const { promisify } = require('util');
-    const execPromise = promisify(exec);
-
-    try {
-      const { stdout, stderr } = await execPromise(command, {
+    // PDF bytes go in on stdin and the DOCX comes back on stdout ("-" paths): no output
+    // file to poll for. The script writes the DOCX only after a successful conversion,
+    // so EOF on stdout with exit code 0 means the buffer is complete.
+    const { spawn } = require('child_process');
+    const docxBuffer = await new Promise((resolve, reject) => {
+      const child = spawn(pythonCmd, [scriptPath, '-', '-'], {
         timeout: 120000 // 2 minute timeout for large files
       });
+      const chunks = [];
+      let stderr = '';
+
+      child.stdout.on('data', (chunk) => chunks.push(chunk));
+      child.stderr.on('data', (chunk) => { stderr += chunk; });
+      child.on('error', reject);
+      child.on('close', (code, signal) => {
+        if (stderr) console.log('⚠️ Python stderr:', stderr);
+        if (code !== 0) {
+          console.log('❌ Python execution error:', signal ? `killed by ${signal}` : `exit code ${code}`);
+          return reject(new Error('PDF conversion failed'));
+        }
+        resolve(Buffer.concat(chunks));
+      });
 
-      if (stdout) console.log('✅ Python output:', stdout);
-      if (stderr) console.log('⚠️ Python stderr:', stderr);
-
-    } catch (execError) {
-      console.log('❌ Python execution error:', execError.message);
-      throw new Error('PDF conversion failed');
-    }
-
-    // Wait a bit for file to be fully written
-    await new Promise(resolve => setTimeout(resolve, 1000));
+      child.stdin.on('error', () => { }); // the close handler reports failures
+      fs.createReadStream(inPath).on('error', reject).pipe(child.stdin);
+    });
 
-    // Check if output exists
-    if (!fs.existsSync(expectedOutput)) {
-      const files = fs.readdirSync(outDir);
-      console.log('📁 Files in directory:', files);
-      throw new Error('Conversion failed - output file not created');
+    if (!docxBuffer.length) {
+      throw new Error('Conversion failed - no output produced');
     }
-
-    const stats = fs.statSync(expectedOutput);
-    console.log('✅ Found DOCX at:', expectedOutput);
-    console.log('✅ DOCX created:', (stats.size / 1024).toFixed(2), 'KB');
+    console.log('✅ DOCX created:', (docxBuffer.length / 1024).toFixed(2), 'KB');
 
     const filename = `${originalBaseName}.docx`;
 
@@ -820,13 +811,8 @@ exports.pdfToWord = async (req, res) => {
 
     res.setHeader('Content-Type', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document');
     res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
-
-    const docxBuffer = fs.readFileSync(expectedOutput);
     res.end(docxBuffer);
 
-    // Cleanup
-    if (fs.existsSync(expectedOutput)) fs.unlinkSync(expectedOutput);
-
   } catch (error) {
     console.log('❌ Error:', error.message);
 
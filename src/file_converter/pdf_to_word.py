@@ -1,31 +1,541 @@
+import io
+import os
 import sys
+import json
+import time
+import queue
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version, PackageNotFoundError
+
+# PyMuPDF prints its notices on stdout, which carries the DOCX bytes (`-` output) or job replies
+os.environ.setdefault('PYMUPDF_MESSAGE', 'fd:2')
 from pdf2docx import Converter
 
-def convert_pdf_to_word(pdf_path, docx_path):
+# Files with fewer pages than this stay in one process: every worker re-opens the PDF
+# and re-runs the document-level analysis, which costs more than it saves on small files
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_TO_WORD_PARALLEL_MIN_PAGES', '8'))
+
+# Finished DOCX files keyed by PDF content, pdf2docx version and options (see DocxCache)
+CACHE_ENABLED = os.environ.get('PDF_TO_WORD_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('PDF_TO_WORD_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache', 'pdf-to-word'
+))
+CACHE_MAX_BYTES = int(os.environ.get('PDF_TO_WORD_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+CACHE_VERSION = 2  # bump when the conversion pipeline changes its output
+
+process_cache = None  # DocxCache opened by open_cache()
+
+try:
+    PDF2DOCX_VERSION = version('pdf2docx')
+except PackageNotFoundError:
+    PDF2DOCX_VERSION = 'unknown'
+
+class DocxCache:
+    """Content-addressed on-disk store of finished DOCX files
+
+    Keys hash the PDF bytes together with the pdf2docx version and the
+    conversion options. Entries are written atomically (temp file + rename) so
+    concurrent conversions can share one directory, and the directory is kept
+    under `max_bytes` by evicting the least recently used files.
+    """
+    SWEEP_INTERVAL = 16  # writes between size checks
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.writes_since_sweep = self.SWEEP_INTERVAL
+        os.makedirs(self.directory, exist_ok=True)
+
+    def make_key(self, pdf_bytes, start, end, workers):
+        # Each parallel worker re-runs the document-level analysis on its own page
+        # run, so the output depends on how many runs the pages were split into
+        options = json.dumps({
+            'version': CACHE_VERSION,
+            'pdf2docx': PDF2DOCX_VERSION,
+            'start': start,
+            'end': end,
+            'workers': workers
+        }, sort_keys=True)
+        digest = hashlib.sha256(options.encode('utf-8') + b'\0')
+        digest.update(pdf_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """DOCX bytes of a cached conversion, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                docx_bytes = f.read()
+            os.utime(path)  # mark as recently used for LRU eviction
+            return docx_bytes
+        except OSError:
+            return None  # missing, or evicted by another process
+
+    def put(self, key, docx_bytes):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(docx_bytes)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"WARNING: Failed to write conversion cache entry: {str(e)}", file=sys.stderr)
+            return
+
+        self.writes_since_sweep += 1
+        if self.writes_since_sweep >= self.SWEEP_INTERVAL:
+            self.writes_since_sweep = 0
+            self.sweep()
+
+    def sweep(self):
+        """Evict least recently used entries until the directory is under max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    if item.name.endswith('.tmp') and now - stat.st_mtime > 3600:
+                        self._remove(item.path)  # left behind by a crashed writer
+                    elif item.name.endswith('.docx'):
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+                        total += stat.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.docx')
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def available_cores():
+    """CPU cores this process may run on (respects container / taskset limits)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def split_page_range(page_indexes, parts):
+    """Cut page indexes into `parts` contiguous runs of nearly equal length, in page order"""
+    count = len(page_indexes)
+    return [page_indexes[count * i // parts:count * (i + 1) // parts] for i in range(parts)]
+
+def plan_workers(page_count, workers=None):
+    """Page workers convert() uses for a range of `page_count` pages; 1 is a serial conversion"""
+    if page_count < PARALLEL_MIN_PAGES:
+        return 1
+    return min(workers or available_cores(), page_count)
+
+def open_converter(source):
+    """Converter for a PDF path, or for the PDF's bytes opened from memory"""
+    if isinstance(source, bytes):
+        return Converter(stream=source)
+    return Converter(source)
+
+def parse_pages(cv, page_indexes, settings):
+    """Parse the given pages of an open converter, returning [(page index, seconds)]
+
+    Same steps as Converter.parse, but each page is timed on its own.
+    """
+    cv.load_pages(pages=page_indexes)
+    cv.parse_document(**settings)
+
+    timings = []
+    for page in cv.pages:
+        if page.skip_parsing:
+            continue
+        started = time.perf_counter()
+        try:
+            page.parse(**settings)
+        except Exception as e:
+            if not settings['ignore_page_error']:
+                raise
+            print(f"WARNING: Ignoring page {page.id + 1}: {str(e)}", file=sys.stderr)
+        timings.append((page.id, time.perf_counter() - started))
+    return timings
+
+def parse_pages_worker(source, page_indexes):
+    """Pool task: parse a run of pages in a fresh converter and return its stored pages"""
+    cv = open_converter(source)
+    try:
+        timings = parse_pages(cv, page_indexes, cv.default_settings)
+        return [page.store() for page in cv.pages if page.finalized], timings
+    finally:
+        cv.close()
+
+def convert(source, docx_target, start=0, end=None, workers=None):
+    """Convert pages [start, end) of a PDF to DOCX and return a timing report
+
+    `source` is a PDF path or the PDF's bytes, `docx_target` a path or a
+    writable binary file object. Large page ranges are split into contiguous
+    runs parsed by a process pool; the parsed pages are restored into one
+    converter and written in page order.
+    """
+    started = time.perf_counter()
+
+    # Create converter instance
+    cv = open_converter(source)
     try:
-        # Create converter instance
-        cv = Converter(pdf_path)
-        
+        settings = cv.default_settings
+        page_indexes = list(range(len(cv.fitz_doc)))[start:end]
+        if not page_indexes:
+            raise ValueError(f"No pages in range {start}-{end}")
+
+        workers = plan_workers(len(page_indexes), workers)
+
+        # Parse pages, in parallel runs for large documents
+        if workers > 1:
+            timings = []
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                runs = split_page_range(page_indexes, workers)
+                for stored, run_timings in pool.map(parse_pages_worker, [source] * workers, runs):
+                    # page_cnt: without it restore() only creates 100 placeholder pages
+                    cv.restore({'page_cnt': len(cv.fitz_doc), 'pages': stored})
+                    timings.extend(run_timings)
+        else:
+            timings = parse_pages(cv, page_indexes, settings)
+        parsed = time.perf_counter()
+
         # Convert PDF to Word
-        cv.convert(docx_path, start=0, end=None)
-        
+        cv.make_docx(docx_target, **settings)
+    finally:
         # Close converter
         cv.close()
-        
-        print(f"SUCCESS: Converted {pdf_path} to {docx_path}")
-        return True
-        
+
+    return {
+        'pages': len(page_indexes),
+        'workers': workers,
+        'parse_ms': round((parsed - started) * 1000, 1),
+        'make_docx_ms': round((time.perf_counter() - parsed) * 1000, 1),
+        'total_ms': round((time.perf_counter() - started) * 1000, 1),
+        'page_ms': {index + 1: round(seconds * 1000, 1) for index, seconds in timings}
+    }
+
+def write_docx(docx_target, docx_bytes):
+    """Write DOCX bytes to a path or a binary file object"""
+    if isinstance(docx_target, str):
+        with open(docx_target, 'wb') as f:
+            f.write(docx_bytes)
+    else:
+        docx_target.write(docx_bytes)
+
+def count_pages(pdf_bytes, start=0, end=None):
+    """Number of pages in [start, end) of a PDF"""
+    cv = Converter(stream=pdf_bytes)
+    try:
+        return len(range(len(cv.fitz_doc))[start:end])
+    finally:
+        cv.close()
+
+def convert_cached(source, docx_target, start=0, end=None, workers=None, cache=None):
+    """convert() behind a DocxCache; the report's `cache` is 'hit', 'miss' or None without a cache
+
+    A hit skips pdf2docx entirely: the stored DOCX is copied to the target and
+    only the page count is read from the PDF.
+    """
+    if cache is None:
+        return {**convert(source, docx_target, start, end, workers), 'cache': None}
+
+    started = time.perf_counter()
+    if not isinstance(source, bytes):
+        with open(source, 'rb') as f:
+            source = f.read()
+    pages = count_pages(source, start, end)
+    key = cache.make_key(source, start, end, plan_workers(pages, workers))
+
+    docx_bytes = cache.get(key)
+    if docx_bytes is not None:
+        write_docx(docx_target, docx_bytes)
+        return {
+            'pages': pages,
+            'workers': 0,
+            'parse_ms': 0.0,
+            'make_docx_ms': 0.0,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1),
+            'page_ms': {},
+            'cache': 'hit'
+        }
+
+    buffer = io.BytesIO()
+    report = convert(source, buffer, start, end, workers)
+    cache.put(key, buffer.getvalue())
+    write_docx(docx_target, buffer.getbuffer())
+    report['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    report['cache'] = 'miss'
+    return report
+
+def open_cache(use_cache=None):
+    """This process's DocxCache if caching is enabled and its directory is usable, else None
+
+    The instance is kept for the life of the process, so jobs run by one pool
+    process share its sweep interval instead of each sweeping the directory.
+    """
+    global process_cache
+    if not (CACHE_ENABLED if use_cache is None else use_cache):
+        return None
+    if process_cache is None:
+        try:
+            process_cache = DocxCache()
+        except OSError as e:
+            print(f"WARNING: Conversion cache unavailable: {str(e)}", file=sys.stderr)
+            return None
+    return process_cache
+
+def convert_pdf_to_word(pdf_path, docx_path, start=0, end=None, workers=None, use_cache=None):
+    """Convert a PDF to DOCX, returning the timing report or None on failure
+
+    A path of `-` reads the PDF bytes from stdin or writes the DOCX bytes to
+    stdout. The DOCX is built in memory and written in one piece only once the
+    conversion succeeded, so stdout carries either the complete file (ended by
+    EOF, with its size in the SUCCESS line on stderr) or nothing at all.
+    """
+    status = sys.stderr if docx_path == '-' else sys.stdout
+    try:
+        source = sys.stdin.buffer.read() if pdf_path == '-' else pdf_path
+        target = io.BytesIO() if docx_path == '-' else docx_path
+        report = convert_cached(source, target, start, end, workers, open_cache(use_cache))
+        cache_note = f" (cache {report['cache']})" if report['cache'] else ''
+
+        if docx_path == '-':
+            report['bytes'] = target.getbuffer().nbytes
+            sys.stdout.buffer.write(target.getbuffer())
+            sys.stdout.buffer.flush()
+            print(f"SUCCESS: Converted {pdf_path} to stdout ({report['bytes']} bytes){cache_note}", file=status)
+        else:
+            print(f"SUCCESS: Converted {pdf_path} to {docx_path}{cache_note}", file=status)
+        return report
+
     except Exception as e:
         print(f"ERROR: {str(e)}", file=sys.stderr)
-        return False
+        return None
+
+def run_job(job, use_cache=None):
+    """Convert one job dict (`id`, `input`, `output`, optional `start`/`end`) into a status reply
+
+    Runs inside a job-pool process, so each job parses its pages serially;
+    concurrency comes from running several jobs at once.
+    """
+    started = time.perf_counter()
+    try:
+        report = convert_cached(job['input'], job['output'], job.get('start') or 0, job.get('end'),
+                                workers=1, cache=open_cache(use_cache))
+        return {
+            'id': job.get('id'),
+            'type': 'result',
+            'status': 'ok',
+            'output': job['output'],
+            'pages': report['pages'],
+            'cache': report['cache'],
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'timings': report
+        }
+    except Exception as e:
+        return {
+            'id': job.get('id'),
+            'type': 'error',
+            'status': 'failed',
+            'error': str(e),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+def parse_job(data):
+    """Check a job line's payload, returning the job dict"""
+    if not isinstance(data, dict):
+        raise ValueError('Job must be a JSON object')
+    for key in ('input', 'output'):
+        if not isinstance(data.get(key), str) or not data[key]:
+            raise ValueError(f"Invalid or missing {key}")
+    for key in ('start', 'end'):
+        if data.get(key) is not None and not isinstance(data[key], int):
+            raise ValueError(f"{key} must be a page index")
+    return data
+
+def write_message(message, lock=threading.Lock()):
+    """Write one JSON message per line to stdout and flush immediately"""
+    with lock:
+        sys.stdout.write(json.dumps(message) + '\n')
+        sys.stdout.flush()
+
+def run_jobs(concurrency, use_cache=None):
+    """Persistent job mode: convert newline-delimited JSON jobs from stdin with bounded concurrency
+
+    Each line is a job (`id`, `input`, `output`, optional `start`/`end`) or a
+    `{"type": "health"}` / `{"type": "shutdown"}` control message. Replies are
+    JSON lines echoing the job `id`, in completion order. At most twice
+    `concurrency` jobs are in the pool at once; later jobs wait in a queue fed
+    by a submitter thread, so control messages are answered while every slot
+    is busy. Shutdown still finishes the jobs read before it.
+    """
+    started = time.time()
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    waiting = queue.Queue()  # parsed jobs not yet submitted; None ends the submitter
+    counts = {'handled': 0, 'failed': 0}
+
+    def finish(job, future):
+        try:
+            reply = future.result()
+        except Exception as e:  # the job's process died
+            reply = {'id': job.get('id'), 'type': 'error', 'status': 'failed', 'error': str(e)}
+        counts['handled'] += 1
+        counts['failed'] += reply['status'] != 'ok'
+        write_message(reply)
+        slots.release()
+
+    def submit_jobs(pool):
+        while True:
+            job = waiting.get()
+            if job is None:
+                return
+            slots.acquire()
+            pool.submit(run_job, job, use_cache).add_done_callback(lambda future, job=job: finish(job, future))
+
+    write_message({'type': 'ready', 'pid': os.getpid(), 'concurrency': concurrency})
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        submitter = threading.Thread(target=submit_jobs, args=(pool,), daemon=True)
+        submitter.start()
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                write_message({'id': None, 'type': 'error', 'status': 'failed', 'error': f'Invalid JSON: {e}'})
+                continue
+
+            job_type = data.get('type', 'convert') if isinstance(data, dict) else 'convert'
+            if job_type == 'health':
+                write_message({
+                    'id': data.get('id'),
+                    'type': 'health',
+                    'status': 'ok',
+                    'jobs_handled': counts['handled'],
+                    'jobs_failed': counts['failed'],
+                    'jobs_queued': waiting.qsize(),
+                    'uptime': int((time.time() - started) * 1000)
+                })
+                continue
+            if job_type == 'shutdown':
+                break
+
+            try:
+                job = parse_job(data)
+            except ValueError as e:
+                job_id = data.get('id') if isinstance(data, dict) else None
+                write_message({'id': job_id, 'type': 'error', 'status': 'failed', 'error': str(e)})
+                continue
+
+            waiting.put(job)
+
+        # Submit what was read before shutdown / EOF; leaving the pool waits for those jobs
+        waiting.put(None)
+        submitter.join()
+
+    write_message({'type': 'shutdown', 'jobs_handled': counts['handled'], 'jobs_failed': counts['failed']})
+
+def run_batch(pdf_paths, out_dir, concurrency, use_cache=None):
+    """Convert many PDFs in one invocation, printing one JSON status line per input in input order
+
+    An input whose output path is already taken by an earlier input (same
+    basename into one --out-dir, or the same PDF twice) fails instead of
+    overwriting that output.
+    """
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    jobs = []
+    replies = [None] * len(pdf_paths)  # filled in up front for rejected inputs
+    claimed = {}  # absolute output path -> index of the input writing it
+    for index, pdf_path in enumerate(pdf_paths):
+        name = os.path.splitext(os.path.basename(pdf_path))[0] + '.docx'
+        output = os.path.join(out_dir or os.path.dirname(pdf_path), name)
+        owner = claimed.setdefault(os.path.abspath(output), index)
+        if owner != index:
+            replies[index] = {
+                'id': index,
+                'type': 'error',
+                'status': 'failed',
+                'error': f"Output {output} is already written for {pdf_paths[owner]}"
+            }
+            continue
+        jobs.append({'id': index, 'input': pdf_path, 'output': output})
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(concurrency, len(jobs)))) as pool:
+        results = pool.map(run_job, jobs, [use_cache] * len(jobs))
+        for reply in replies:
+            reply = reply or next(results)
+            failed += reply['status'] != 'ok'
+            write_message(reply)
+    return failed
+
+def print_timing_report(report, slowest=5, file=None):
+    """Summarize where the conversion spent its time"""
+    print(f"TIMING: {report['pages']} pages with {report['workers']} worker(s) in {report['total_ms']} ms "
+          f"(parse {report['parse_ms']} ms, write {report['make_docx_ms']} ms)", file=file)
+    pages = sorted(report['page_ms'].items(), key=lambda item: item[1], reverse=True)
+    for page, ms in pages[:slowest]:
+        print(f"TIMING: page {page} parsed in {ms} ms", file=file)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a PDF to Word with pdf2docx')
+    parser.add_argument('paths', nargs='*',
+                        help='<input.pdf> <output.docx> (- for stdin / stdout), or the input PDFs with --batch')
+    parser.add_argument('--jobs', action='store_true',
+                        help='stay alive and convert newline-delimited JSON jobs from stdin')
+    parser.add_argument('--batch', action='store_true',
+                        help='convert every given PDF, writing <name>.docx next to it or into --out-dir')
+    parser.add_argument('--out-dir', default=None, help='output directory for --batch')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='documents converted at once with --jobs/--batch (default: available cores)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always convert, bypassing the DOCX cache under cache/pdf-to-word')
+    parser.add_argument('--start', type=int, default=0, help='first page to convert (zero-based, default: 0)')
+    parser.add_argument('--end', type=int, default=None, help='page to stop before (zero-based, default: last page)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f'parallel page workers (default: available cores; one process below '
+                             f'{PARALLEL_MIN_PAGES} pages)')
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    args = parse_args()
+    concurrency = max(1, args.concurrency or available_cores())
+    use_cache = False if args.no_cache else None
+
+    if args.jobs:
+        run_jobs(concurrency, use_cache)
+        sys.exit(0)
+
+    if args.batch:
+        if not args.paths:
+            print("Usage: python pdf_to_word.py --batch <input.pdf>... [--out-dir DIR]")
+            sys.exit(1)
+        sys.exit(0 if run_batch(args.paths, args.out_dir, concurrency, use_cache) == 0 else 1)
+
+    if len(args.paths) != 2:
         print("Usage: python pdf_to_word.py <input.pdf> <output.docx>")
         sys.exit(1)
-    
-    pdf_path = sys.argv[1]
-    docx_path = sys.argv[2]
-    
-    success = convert_pdf_to_word(pdf_path, docx_path)
-    sys.exit(0 if success else 1)
+
+    report = convert_pdf_to_word(args.paths[0], args.paths[1], args.start, args.end, args.workers, use_cache)
+    if report is not None:
+        print_timing_report(report, file=sys.stderr if args.paths[1] == '-' else sys.stdout)
+    sys.exit(0 if report is not None else 1)
@@ -1,34 +1,663 @@
+import time
+PROCESS_START = time.time()
 import sys
-sys.stderr.write("AI Detector script starting...\n")
-sys.stdout.flush()
+import os
 import json
-import time
 import re
 import math
+import mmap
+import struct
+import argparse
+import hashlib
+import socket
+import selectors
+import tempfile
+import unicodedata
+import importlib.util
+import tracemalloc
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, deque
+
+# stderr logging: 0 = errors and warnings only, 1 = also startup/model/worker lifecycle,
+# 2 = also per-request and per-stage detail (the hot path)
+LOG_ERROR, LOG_INFO, LOG_DEBUG = 0, 1, 2
+VERBOSITY = int(os.environ.get('AI_DETECTOR_VERBOSITY', str(LOG_INFO)))
+
+def log(level, message, *args):
+    """Write one log line to stderr if `level` is enabled; `args` are %-formatted only then"""
+    if level <= VERBOSITY:
+        print(message % args if args else message, file=sys.stderr)
+
 import numpy as np
-from collections import Counter
 import warnings
 warnings.filterwarnings('ignore')
 
-# Try to import neural libraries
-try:
-    from transformers import GPT2LMHeadModel, GPT2TokenizerFast
-    import torch
-    from sentence_transformers import SentenceTransformer
-    NEURAL_AVAILABLE = True
-    print("🧠 Neural libraries loaded successfully", file=sys.stderr)
-except ImportError as e:
-    NEURAL_AVAILABLE = False
-    print(f"⚠️ Neural libraries not available: {e}", file=sys.stderr)
-    print("📊 Falling back to enhanced statistical analysis", file=sys.stderr)
+# Neural libraries are heavy (torch alone takes seconds to import), so only check
+# that they are installed here and import them the first time a neural stage runs
+NEURAL_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None
+    for name in ('torch', 'transformers', 'sentence_transformers')
+)
+torch = None
+GPT2LMHeadModel = None
+GPT2TokenizerFast = None
+SentenceTransformer = None
+
+def load_neural_libraries():
+    """Import torch, transformers and sentence-transformers on first use"""
+    global NEURAL_AVAILABLE, torch, GPT2LMHeadModel, GPT2TokenizerFast, SentenceTransformer
+    if torch is not None:
+        return True
+    if not NEURAL_AVAILABLE:
+        log(LOG_ERROR, "⚠️ Neural libraries not available")
+        return False
+    
+    try:
+        import torch as torch_module
+        from transformers import GPT2LMHeadModel as gpt2_model_class, GPT2TokenizerFast as gpt2_tokenizer_class
+        from sentence_transformers import SentenceTransformer as sentence_transformer_class
+    except ImportError as e:
+        NEURAL_AVAILABLE = False
+        log(LOG_ERROR, f"⚠️ Neural libraries not available: {e}")
+        log(LOG_INFO, "📊 Falling back to enhanced statistical analysis")
+        return False
+    
+    if VERBOSITY < LOG_INFO:
+        # Model-loading progress bars and config warnings are lifecycle noise too
+        from transformers.utils import logging as transformers_logging
+        transformers_logging.set_verbosity_error()
+        transformers_logging.disable_progress_bar()
+    
+    torch = torch_module
+    GPT2LMHeadModel = gpt2_model_class
+    GPT2TokenizerFast = gpt2_tokenizer_class
+    SentenceTransformer = sentence_transformer_class
+    log(LOG_INFO, "🧠 Neural libraries loaded successfully")
+    return True
+
+# safetensors header dtype -> torch dtype name
+SAFETENSORS_DTYPES = {
+    'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+    'I64': 'int64', 'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool'
+}
+
+def mmap_safetensors(path):
+    """State dict whose tensors are views into a copy-on-write mmap of a .safetensors file
+    
+    Pages are read straight from the OS page cache, so every detector process
+    that maps the same file shares one copy of the weights.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header_size = struct.unpack('<Q', mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_size])
+    data_start = 8 + header_size
+    
+    state_dict = {}
+    for name, entry in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = getattr(torch, SAFETENSORS_DTYPES[entry['dtype']])
+        begin, end = entry['data_offsets']
+        if end == begin:
+            tensor = torch.empty(0, dtype=dtype)
+        else:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                                      offset=data_start + begin)
+        state_dict[name] = tensor.reshape(entry['shape'])
+    return state_dict
+
+@contextmanager
+def parameters_on_meta():
+    """Create nn.Module parameters on the meta device (no storage, no init cost); buffers stay real"""
+    register_parameter = torch.nn.Module.register_parameter
+    
+    def register_on_meta(module, name, param):
+        register_parameter(module, name, param)
+        if param is not None:
+            param = module._parameters[name]
+            module._parameters[name] = type(param)(param.to('meta'), requires_grad=param.requires_grad)
+    
+    torch.nn.Module.register_parameter = register_on_meta
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register_parameter
+
+def assign_mmap_weights(model, path):
+    """Point the model's parameters at the memory-mapped weights in a .safetensors file"""
+    expected = set(model.state_dict())
+    prefix = getattr(model, 'base_model_prefix', '')
+    state_dict = {}
+    for name, tensor in mmap_safetensors(path).items():
+        # Checkpoints saved from the base model lack its prefix, and vice versa
+        if name not in expected and prefix:
+            if f'{prefix}.{name}' in expected:
+                name = f'{prefix}.{name}'
+            elif name.startswith(f'{prefix}.') and name[len(prefix) + 1:] in expected:
+                name = name[len(prefix) + 1:]
+        state_dict[name] = tensor
+    
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    if hasattr(model, 'tie_weights'):
+        model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"{path} has no weights for {', '.join(missing[:5])}")
+
+# Number of text chunks scored together in one GPT-2 forward pass
+PERPLEXITY_BATCH_SIZE = int(os.environ.get('AI_DETECTOR_BATCH_SIZE', '8'))
+# GPT-2 window size in tokens and the step between window starts (stride == size means no overlap)
+CHUNK_TOKENS = int(os.environ.get('AI_DETECTOR_CHUNK_TOKENS', '256'))
+CHUNK_STRIDE = int(os.environ.get('AI_DETECTOR_CHUNK_STRIDE', str(CHUNK_TOKENS)))
+
+# `full` runs every analyzer; `fast` runs only the statistical + style ensemble and never loads torch
+# `cascade` runs the neural stages only while the cheaper stages leave the result
+# within CASCADE_BAND points of 50
+DETECTION_MODES = ('full', 'fast', 'cascade')
+DEFAULT_MODE = os.environ.get('AI_DETECTOR_MODE', 'full')
+CASCADE_BAND = float(os.environ.get('AI_DETECTOR_CASCADE_BAND', '15'))
+
+# CPU inference profiles: which checkpoints to load and whether to int8-quantize their linear layers
+INFERENCE_PROFILES = {
+    'full': {'gpt2': 'gpt2', 'sentence': 'all-MiniLM-L6-v2', 'quantize': False},
+    'quantized': {'gpt2': 'gpt2', 'sentence': 'all-MiniLM-L6-v2', 'quantize': True},
+    'distilled': {'gpt2': 'distilgpt2', 'sentence': 'all-MiniLM-L6-v2', 'quantize': False}
+}
+DEFAULT_INFERENCE_PROFILE = os.environ.get('AI_DETECTOR_PROFILE', 'full')
+# Local model store (one sub-directory per checkpoint name, e.g. <dir>/gpt2); when set,
+# models load offline from it with safetensors weights memory-mapped
+MODEL_DIR = os.environ.get('AI_DETECTOR_MODEL_DIR') or None
+
+# Sentences with fewer scored GPT-2 tokens are too noisy for the sentence-level perplexity report
+SENTENCE_MIN_TOKENS = int(os.environ.get('AI_DETECTOR_SENTENCE_MIN_TOKENS', '3'))
+
+ENSEMBLE_STAGES = ('statistical', 'perplexity', 'coherence', 'neural_embedding', 'writing_style')
+NEURAL_STAGES = ('perplexity', 'coherence', 'neural_embedding')
+
+# Bump whenever scoring changes so cached results from older detectors are ignored
+DETECTOR_VERSION = 'hybrid-v2.2'
+
+# Result cache: in-process LRU in front of a shared on-disk store
+CACHE_ENABLED = os.environ.get('AI_DETECTOR_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('AI_DETECTOR_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'cache', 'ai-detection', 'hybrid'
+))
+CACHE_TTL = int(os.environ.get('AI_DETECTOR_CACHE_TTL', str(24 * 60 * 60)))  # seconds
+CACHE_MAX_BYTES = int(os.environ.get('AI_DETECTOR_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_MEMORY_ENTRIES = int(os.environ.get('AI_DETECTOR_CACHE_ENTRIES', '256'))
+
+# Sentence-level cache of MiniLM embeddings and GPT-2 token losses (in-process LRU, 0 = off),
+# so re-checking an edited document only runs the models on changed sentences
+SENTENCE_CACHE_BYTES = int(os.environ.get('AI_DETECTOR_SENTENCE_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+# Streaming mode: paragraphs are grouped into sections of at least this many words
+# (over-long paragraphs are cut at sentence ends) and each section is scored on its own
+STREAM_SECTION_WORDS = int(os.environ.get('AI_DETECTOR_SECTION_WORDS', '400'))
+
+# Sampling: texts longer than SAMPLE_THRESHOLD characters (0 = never) are scored on one
+# section per stratum from SAMPLE_SECTIONS equal strata, so their cost no longer grows with length
+SAMPLE_THRESHOLD = int(os.environ.get('AI_DETECTOR_SAMPLE_THRESHOLD', '0'))
+SAMPLE_SECTIONS = int(os.environ.get('AI_DETECTOR_SAMPLE_SECTIONS', '8'))
+SAMPLE_CONFIDENCE_Z = 1.96  # 95% interval around the sampled estimate
+SAMPLE_CHARS_PER_WORD = 12  # generous bound used to cap how far a sampled section may reach
+
+# Per-stage instrumentation: tracemalloc peaks in breakdown.timings, and a JSONL trace file
+# with one line of stage timings per analyzed document
+TRACE_MEMORY = os.environ.get('AI_DETECTOR_TRACE_MEMORY', '0') == '1'
+TRACE_FILE = os.environ.get('AI_DETECTOR_TRACE_FILE') or None
+
+# Pool mode: one parent loads the models, forked workers share the weights copy-on-write.
+# Few workers with many threads each favours latency; many single-threaded workers favour throughput
+POOL_THREADS = int(os.environ.get('AI_DETECTOR_POOL_THREADS', '1'))
+POOL_WORKERS = int(os.environ.get('AI_DETECTOR_POOL_WORKERS', '0'))  # 0 = cpu count / threads per worker
+
+# Columns of the batch feature matrix, in extract_statistical_features() key order
+STATISTICAL_FEATURES = (
+    'ai_phrase_density', 'sentence_uniformity', 'vocabulary_complexity', 'transition_density', 'repetition_score'
+)
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'[.!?]+')
+PARAGRAPH_SEPARATOR = '\n\n'
+
+class ResultCache:
+    """Content-addressed detection result cache: in-process LRU plus an on-disk store
+    
+    Keys are a hash of the NFC-normalized text and a detector fingerprint. Disk entries
+    are written atomically (temp file + rename) so several worker processes can
+    share one directory; the directory is kept under `max_bytes` by evicting the
+    least recently used entries, and entries older than `ttl` seconds are ignored.
+    """
+    SWEEP_INTERVAL = 32  # disk writes between size checks
+    
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES,
+                 memory_entries=CACHE_MEMORY_ENTRIES):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.writes_since_sweep = self.SWEEP_INTERVAL
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            log(LOG_ERROR, f"⚠️ Result cache directory unavailable, memory only: {e}")
+            self.directory = None
+    
+    @staticmethod
+    def normalize_text(text):
+        # Whitespace is kept: results carry character offsets and GPT-2 tokens depend on it
+        return unicodedata.normalize('NFC', text)
+    
+    def make_key(self, text, fingerprint):
+        payload = fingerprint + '\0' + self.normalize_text(text)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Return (result, tier) for a fresh entry, or (None, None) on a miss"""
+        now = time.time()
+        
+        entry = self.memory.get(key)
+        if entry is not None:
+            stored_at, payload = entry
+            if now - stored_at < self.ttl:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload), 'memory'
+            del self.memory[key]
+        
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                if now - entry['stored_at'] < self.ttl:
+                    os.utime(path)  # mark as recently used for LRU eviction
+                    self._remember(key, entry['stored_at'], json.dumps(entry['result']))
+                    self.hits += 1
+                    return entry['result'], 'disk'
+                os.remove(path)
+            except (OSError, ValueError, KeyError):
+                pass  # missing, expired by another process, or half-written by a crashed one
+        
+        self.misses += 1
+        return None, None
+    
+    def put(self, key, result):
+        stored_at = time.time()
+        payload = json.dumps(result)
+        self._remember(key, stored_at, payload)
+        
+        if self.directory is None:
+            return
+        
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('{"stored_at": %r, "result": %s}' % (stored_at, payload))
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            log(LOG_ERROR, f"⚠️ Failed to write result cache entry: {e}")
+            return
+        
+        self.writes_since_sweep += 1
+        if self.writes_since_sweep >= self.SWEEP_INTERVAL:
+            self.writes_since_sweep = 0
+            self.sweep()
+    
+    def sweep(self):
+        """Drop expired entries and evict least recently used ones until under max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    is_stale_temp = item.name.endswith('.tmp') and now - stat.st_mtime > 3600
+                    if is_stale_temp or (item.name.endswith('.json') and now - stat.st_mtime > self.ttl):
+                        self._remove(item.path)
+                    elif item.name.endswith('.json'):
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+                        total += stat.st_size
+        except OSError:
+            return
+        
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+    
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'memory_entries': len(self.memory)}
+    
+    def _remember(self, key, stored_at, payload):
+        self.memory[key] = (stored_at, payload)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class SentenceCache:
+    """In-process LRU of per-sentence model outputs, bounded by the bytes of the stored arrays
+    
+    `embedding` entries hold a sentence's MiniLM vector keyed by its normalized
+    text; `losses` entries hold the GPT-2 token losses of a sentence keyed by its
+    token ids. Losses are stored as scored in the document they came from, so a
+    reused sentence keeps the left context it had there.
+    """
+    
+    def __init__(self, max_bytes=SENTENCE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+    
+    @staticmethod
+    def make_key(kind, payload):
+        return kind, hashlib.blake2b(payload, digest_size=16).digest()
+    
+    def embedding_key(self, sentence):
+        return self.make_key('embedding', ResultCache.normalize_text(sentence).encode('utf-8'))
+    
+    def losses_key(self, token_ids):
+        return self.make_key('losses', np.asarray(token_ids, dtype=np.int64).tobytes())
+    
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+    
+    def put(self, key, value):
+        if key in self.entries:
+            return
+        self.entries[key] = value
+        self.size += value.nbytes
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+    
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.size}
+
+class PhraseMatcher:
+    """Counts every phrase of several phrase lists in a single regex pass
+    
+    All phrases are compiled into one prefix-trie alternation wrapped in a
+    lookahead, so hits are found at every word boundary in one scan regardless
+    of how many phrases there are. The lookahead reports overlapping hits, so a
+    hit that starts before the previous hit of the same phrase ended is skipped;
+    counts are then identical to running a separate `\\bphrase\\b` findall per
+    phrase.
+    """
+    
+    def __init__(self, phrase_lists):
+        self.phrase_lists = {name: list(phrases) for name, phrases in phrase_lists.items()}
+        phrases = sorted({phrase for group in self.phrase_lists.values() for phrase in group})
+        
+        # The trie prefers the longest phrase starting at a position; shorter phrases
+        # that end on a word boundary inside it match there too and are credited explicitly
+        self.nested_prefixes = {
+            phrase: [other for other in phrases
+                     if other != phrase and phrase.startswith(other)
+                     and re.match(r'(?s).\b', phrase[len(other) - 1:]) is not None]
+            for phrase in phrases
+        }
+        self.pattern = re.compile(r'\b(?=(' + self._trie_pattern(phrases) + r')\b)') if phrases else None
+    
+    @staticmethod
+    def _trie_pattern(phrases):
+        trie = {}
+        for phrase in phrases:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        
+        def build(node):
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            return '(?:' + body + ')?' if '' in node else body
+        
+        return build(trie)
+    
+    def count(self, text_lower):
+        """Per-phrase hit counts over lowercase text"""
+        counts = Counter()
+        if self.pattern is None:
+            return counts
+        
+        last_end = {}  # phrase -> end offset of its last counted hit
+        for match in self.pattern.finditer(text_lower):
+            start = match.start()
+            phrase = match.group(1)
+            for hit in (phrase, *self.nested_prefixes[phrase]):
+                if start >= last_end.get(hit, 0):
+                    counts[hit] += 1
+                    last_end[hit] = start + len(hit)
+        return counts
+    
+    def total(self, counts, name):
+        """Total hits of one phrase list"""
+        return sum(counts[phrase] for phrase in self.phrase_lists[name])
+
+class TextProfile:
+    """Tokenization of one document, built once and read by every analyzer
+    
+    Holds the lowercase text, word tokens (also as interned integer ids and word
+    lengths for the vectorized kernels), sentences with their character spans,
+    per-sentence word counts and starters, and paragraph spans with word counts.
+    """
+    __slots__ = (
+        'text', 'lower', 'words', 'token_ids', 'vocabulary_size', 'word_lengths', 'sentences',
+        'sentence_spans', 'sentence_word_counts', 'sentence_starters', 'paragraph_spans',
+        'paragraph_word_counts', 'phrase_counts'
+    )
+    
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.words = WORD_PATTERN.findall(self.lower)
+        self.phrase_counts = None  # filled lazily by the detector's phrase matcher
+        
+        # Each distinct word gets the next integer id, in order of first appearance
+        vocabulary = {}
+        self.token_ids = np.fromiter(
+            (vocabulary.setdefault(word, len(vocabulary)) for word in self.words),
+            dtype=np.int64, count=len(self.words)
+        )
+        self.vocabulary_size = len(vocabulary)
+        self.word_lengths = np.fromiter(map(len, self.words), dtype=np.int64, count=len(self.words))
+        
+        # Sentences: stripped, non-empty segments between [.!?]+ runs
+        self.sentences = []
+        self.sentence_spans = []
+        self.sentence_word_counts = []
+        self.sentence_starters = []
+        segment_start = 0
+        for boundary in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+            self._add_sentence(segment_start, boundary.start())
+            segment_start = boundary.end()
+        self._add_sentence(segment_start, len(text))
+        
+        # Paragraphs: every blank-line separated block, word counts for non-empty ones
+        self.paragraph_spans = []
+        self.paragraph_word_counts = []
+        paragraph_start = 0
+        for paragraph in text.split(PARAGRAPH_SEPARATOR):
+            paragraph_end = paragraph_start + len(paragraph)
+            self.paragraph_spans.append((paragraph_start, paragraph_end))
+            if paragraph.strip():
+                self.paragraph_word_counts.append(len(paragraph.split()))
+            paragraph_start = paragraph_end + len(PARAGRAPH_SEPARATOR)
+    
+    def _add_sentence(self, start, end):
+        segment = self.text[start:end]
+        sentence = segment.strip()
+        if not sentence:
+            return
+        
+        start += len(segment) - len(segment.lstrip())
+        tokens = sentence.split()
+        self.sentences.append(sentence)
+        self.sentence_spans.append((start, start + len(sentence)))
+        self.sentence_word_counts.append(len(tokens))
+        self.sentence_starters.append(tokens[0].lower())
+
+def ngram_keys(token_ids, vocabulary_size, n):
+    """One integer per n-gram of consecutive token ids (mixed radix, so collision free)"""
+    count = len(token_ids) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    if vocabulary_size ** n >= 2 ** 63:
+        # Would overflow int64; number the distinct id tuples instead
+        grams = np.stack([token_ids[i:i + count] for i in range(n)], axis=1)
+        return np.unique(grams, axis=0, return_inverse=True)[1].reshape(-1)
+    
+    keys = token_ids[:count].copy()
+    for i in range(1, n):
+        keys *= vocabulary_size
+        keys += token_ids[i:i + count]
+    return keys
+
+def count_repeated_ngrams(token_ids, vocabulary_size, n, min_count):
+    """Number of distinct n-grams occurring more than `min_count` times"""
+    keys = ngram_keys(token_ids, vocabulary_size, n)
+    if not len(keys):
+        return 0
+    counts = np.unique(keys, return_counts=True)[1]
+    return int(np.count_nonzero(counts > min_count))
+
+def segment_mean_std(values, lengths):
+    """Mean and population std of consecutive segments of `values` with the given lengths
+    
+    Every segment must be non-empty. Segments of equal length are gathered into
+    one 2-D block and reduced along its rows, which sums each row in the same
+    pairwise order as np.mean / np.std on a 1-D slice, so results are bitwise
+    identical to calling those per segment.
+    """
+    values = np.asarray(values)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    means = np.empty(len(lengths))
+    stds = np.empty(len(lengths))
+    for length in np.unique(lengths):
+        segments = np.flatnonzero(lengths == length)
+        block = values[starts[segments, None] + np.arange(length)]
+        means[segments] = block.mean(axis=1)
+        stds[segments] = block.std(axis=1)
+    return means, stds
 
-print("🐍 Advanced Hybrid Neural AI Detector Starting...", file=sys.stderr)
+class SectionAggregate:
+    """Running word-weighted aggregates over the sections of a streamed document
+    
+    Only sums are kept, so memory does not grow with the number of sections. A
+    stage skipped by a cascade section is averaged over the sections that ran it.
+    """
+    # ensemble stage -> score key in a result's breakdown
+    STAGE_SCORES = {
+        'statistical': ('statistical_score',),
+        'perplexity': ('neural_breakdown', 'perplexity_score'),
+        'coherence': ('neural_breakdown', 'coherence_score'),
+        'neural_embedding': ('neural_breakdown', 'embedding_score'),
+        'writing_style': ('neural_breakdown', 'style_score')
+    }
+    
+    def __init__(self):
+        self.sections = 0
+        self.text_length = 0
+        self.word_count = 0
+        self.stage_sums = {}  # stage -> (weighted score sum, weight)
+        self.feature_sums = Counter()
+        self.phrase_counts = Counter()
+        self.timings = Counter()
+    
+    def add(self, result, text_length, word_count):
+        breakdown = result['breakdown']
+        weight = max(word_count, 1)
+        self.sections += 1
+        self.text_length += text_length
+        self.word_count += word_count
+        
+        for stage in breakdown['stages_run']:
+            value = breakdown
+            for key in self.STAGE_SCORES[stage]:
+                value = value[key]
+            total, weights = self.stage_sums.get(stage, (0.0, 0))
+            self.stage_sums[stage] = (total + value * weight, weights + weight)
+        
+        for name, value in breakdown['feature_breakdown'].items():
+            self.feature_sums[name] += value * weight
+        self.phrase_counts.update(breakdown['phrase_counts'])
+        self.timings.update({
+            stage: value for stage, value in breakdown.get('timings', {}).items() if stage != 'memory_peak_kb'
+        })
+    
+    def analysis(self):
+        """Aggregate in the shape of an analyze_base() result, ready for score_document()"""
+        weight = max(self.word_count, 1)
+        return {
+            'text_length': self.text_length,
+            'word_count': self.word_count,
+            'phrase_counts': self.phrase_counts,
+            'statistical_features': {name: total / weight for name, total in self.feature_sums.items()},
+            'scores': {stage: total / weights for stage, (total, weights) in self.stage_sums.items()},
+            'timings': {stage: round(value, 3) for stage, value in self.timings.items()}
+        }
 
 class HybridNeuralAIDetector:
     """Advanced hybrid AI detection using neural + statistical + style methods"""
     
-    def __init__(self):
-        print("🔧 Initializing advanced hybrid neural detector...", file=sys.stderr)
+    def __init__(self, perplexity_batch_size=None, chunk_tokens=None, chunk_stride=None, use_cache=None,
+                 mode=None, cascade_band=None, inference_profile=None, section_words=None,
+                 trace_memory=None, trace_file=None, model_dir=None, sample_threshold=None, sample_sections=None,
+                 sentence_cache_bytes=None):
+        log(LOG_INFO, "🔧 Initializing advanced hybrid neural detector...")
+        
+        self.mode = mode or DEFAULT_MODE
+        if self.mode not in DETECTION_MODES:
+            raise ValueError(f"Unknown detection mode: {self.mode}")
+        self.cascade_band = CASCADE_BAND if cascade_band is None else cascade_band
+        self.inference_profile = inference_profile or DEFAULT_INFERENCE_PROFILE
+        self.section_words = section_words or STREAM_SECTION_WORDS
+        self.sample_threshold = SAMPLE_THRESHOLD if sample_threshold is None else sample_threshold
+        self.sample_sections = max(2, sample_sections or SAMPLE_SECTIONS)
+        self.model_dir = model_dir or MODEL_DIR
+        self.model_load = None
+        self.trace_memory = TRACE_MEMORY if trace_memory is None else trace_memory
+        self.trace_file = trace_file or TRACE_FILE
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.inference_profile not in INFERENCE_PROFILES:
+            raise ValueError(f"Unknown inference profile: {self.inference_profile}")
+        
+        use_cache = CACHE_ENABLED if use_cache is None else use_cache
+        self.result_cache = ResultCache() if use_cache else None
+        sentence_cache_bytes = SENTENCE_CACHE_BYTES if sentence_cache_bytes is None else sentence_cache_bytes
+        self.sentence_cache = SentenceCache(sentence_cache_bytes) if sentence_cache_bytes > 0 else None
+        
+        self.perplexity_batch_size = max(1, perplexity_batch_size or PERPLEXITY_BATCH_SIZE)
+        self.chunk_tokens = max(2, chunk_tokens or CHUNK_TOKENS)
+        self.chunk_stride = max(1, min(chunk_stride or CHUNK_STRIDE, self.chunk_tokens))
         
         # Enhanced AI detection patterns (comprehensive academic + conversational)
         self.ai_phrases = [
@@ -50,91 +679,602 @@ class HybridNeuralAIDetector:
             'what\'s interesting is', 'the key point is', 'importantly'
         ]
         
-        # Initialize neural components
+        # Discourse transitions counted separately from the AI phrase list
+        self.transition_phrases = [
+            'however', 'nevertheless', 'furthermore', 'moreover', 'therefore', 'thus', 'hence',
+            'in addition', 'in conclusion', 'as a result', 'on the other hand',
+            'similarly', 'likewise', 'consequently', 'meanwhile', 'thereafter', 'notably',
+            'specifically', 'particularly', 'essentially', 'ultimately', 'indeed'
+        ]
+        
+        # Both lists are matched together in one pass over the text
+        self.phrase_matcher = PhraseMatcher({
+            'ai_phrases': self.ai_phrases,
+            'transitions': self.transition_phrases
+        })
+        
+        # Initialize neural components; fast detectors load them only if a full request arrives
         self.neural_ready = False
-        if NEURAL_AVAILABLE:
+        self.neural_attempted = False
+        if self.mode != 'fast':
             self.setup_neural_models()
     
     def setup_neural_models(self):
         """Initialize neural models for advanced detection"""
+        self.neural_attempted = True
+        if self.model_dir:
+            # Never reach for the network when a local store is configured
+            os.environ['HF_HUB_OFFLINE'] = '1'
+            os.environ['TRANSFORMERS_OFFLINE'] = '1'
+        if not load_neural_libraries():
+            return
+        
         try:
-            print("📚 Loading neural models...", file=sys.stderr)
+            profile = INFERENCE_PROFILES[self.inference_profile]
+            source = self.model_dir or 'hub'
+            log(LOG_INFO, f"📚 Loading neural models ({self.inference_profile} profile, from {source})...")
             
             # Load sentence transformer for semantic analysis
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-            print("✅ Sentence transformer loaded", file=sys.stderr)
+            started = time.perf_counter()
+            self.sentence_model = self.load_sentence_model(profile['sentence'])
+            self.sentence_model.eval()
+            sentence_ms = (time.perf_counter() - started) * 1000
+            log(LOG_INFO, "✅ Sentence transformer loaded")
             
             # Load GPT-2 for perplexity calculation
-            self.gpt2_model = GPT2LMHeadModel.from_pretrained('gpt2')
-            self.gpt2_tokenizer = GPT2TokenizerFast.from_pretrained('gpt2')
+            started = time.perf_counter()
+            self.gpt2_model = self.load_gpt2_model(profile['gpt2'])
+            self.gpt2_tokenizer = GPT2TokenizerFast.from_pretrained(self.model_path(profile['gpt2']),
+                                                                    local_files_only=bool(self.model_dir))
             self.gpt2_model.eval()
+            gpt2_ms = (time.perf_counter() - started) * 1000
             
             # Set pad token
             if self.gpt2_tokenizer.pad_token is None:
                 self.gpt2_tokenizer.pad_token = self.gpt2_tokenizer.eos_token
             
-            print("✅ GPT-2 perplexity model loaded", file=sys.stderr)
+            if profile['quantize']:
+                self.quantize_neural_models()
+            
+            self.model_load = {
+                'source': 'model_dir' if self.model_dir else 'hub',
+                'mmap': bool(self.model_dir),
+                'sentence_ms': round(sentence_ms, 1),
+                'gpt2_ms': round(gpt2_ms, 1)
+            }
+            log(LOG_INFO, f"✅ GPT-2 perplexity model loaded ({sentence_ms + gpt2_ms:.0f} ms for both models)")
             self.neural_ready = True
             
         except Exception as e:
-            print(f"❌ Error loading neural models: {e}", file=sys.stderr)
+            log(LOG_ERROR, f"❌ Error loading neural models: {e}")
             self.neural_ready = False
     
-    def detect(self, text):
-        """Main detection method using advanced hybrid approach"""
-        print(f"🔍 Analyzing text: {text[:50]}...", file=sys.stderr)
+    def model_path(self, name):
+        """Directory of a checkpoint in the local model store, or the hub name when there is none"""
+        if not self.model_dir:
+            return name
+        path = os.path.join(self.model_dir, name)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Model {name} not found in {self.model_dir}")
+        return path
+    
+    def load_sentence_model(self, name):
+        """MiniLM sentence encoder; from the model store its weights are memory-mapped
+        
+        SentenceTransformer always moves itself to a device while loading, which rules
+        out meta-device construction, so it loads normally and then swaps its
+        weights for the mapped ones, releasing the private copy.
+        """
+        if not self.model_dir:
+            return SentenceTransformer(name)
+        
+        path = self.model_path(name)
+        model = SentenceTransformer(path, local_files_only=True)
+        weights = os.path.join(path, 'model.safetensors')
+        if os.path.exists(weights):
+            assign_mmap_weights(model[0].auto_model, weights)
+        return model
+    
+    def load_gpt2_model(self, name):
+        """GPT-2 LM; from the model store it is built on the meta device and given memory-mapped weights"""
+        if not self.model_dir:
+            return GPT2LMHeadModel.from_pretrained(name)
+        
+        path = self.model_path(name)
+        weights = os.path.join(path, 'model.safetensors')
+        if not os.path.exists(weights):
+            return GPT2LMHeadModel.from_pretrained(path, local_files_only=True)
+        
+        config = GPT2LMHeadModel.config_class.from_pretrained(path, local_files_only=True)
+        with parameters_on_meta():
+            model = GPT2LMHeadModel(config)
+        assign_mmap_weights(model, weights)
+        return model
+    
+    def quantize_neural_models(self):
+        """Dynamic int8 quantization of the linear layers of both models (CPU inference)"""
+        # GPT-2 implements its projections as transformers' Conv1D, which dynamic
+        # quantization does not recognise; swap them for equivalent nn.Linear layers first
+        self.convert_conv1d_to_linear(self.gpt2_model)
+        self.gpt2_model = torch.ao.quantization.quantize_dynamic(
+            self.gpt2_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        self.sentence_model = torch.ao.quantization.quantize_dynamic(
+            self.sentence_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        log(LOG_INFO, "✅ Neural models quantized to int8")
+    
+    @staticmethod
+    def convert_conv1d_to_linear(module):
+        """Replace every transformers Conv1D (weight stored as in x out) with an nn.Linear"""
+        for name, child in module.named_children():
+            if type(child).__name__ == 'Conv1D':
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, name, linear)
+            else:
+                HybridNeuralAIDetector.convert_conv1d_to_linear(child)
+    
+    def resolve_mode(self, mode=None):
+        """Validate a per-request mode and return (mode, use_neural), loading models on demand"""
+        mode = mode or self.mode
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Unknown detection mode: {mode}")
+        
+        if mode != 'fast' and not self.neural_attempted:
+            self.setup_neural_models()
+        return mode, mode != 'fast' and self.neural_ready
+    
+    def cache_fingerprint(self, mode, neural):
+        """Everything besides the text that changes the result of detect"""
+        return json.dumps({
+            'version': DETECTOR_VERSION,
+            'mode': mode,
+            'neural': neural,
+            'inference_profile': self.inference_profile if neural else None,
+            'cascade_band': self.cascade_band if mode == 'cascade' else None,
+            'chunk_tokens': self.chunk_tokens,
+            'chunk_stride': self.chunk_stride,
+            'sampling': [self.sample_threshold, self.sample_sections, self.section_words] if self.sample_threshold else None,
+            'sentence_cache': self.sentence_cache is not None if neural else None
+        }, sort_keys=True)
+    
+    def detect(self, text, mode=None):
+        """Main detection method using advanced hybrid approach, served from the result cache when possible"""
+        return self.detect_many([text], mode)[0]
+    
+    def detect_many(self, texts, mode=None):
+        """Detect several documents at once, returning one result per text in input order
+        
+        Cached documents are answered directly; the rest are analyzed together so
+        their GPT-2 windows and MiniLM sentences share forward-pass batches.
+        """
+        mode, neural = self.resolve_mode(mode)
+        if self.result_cache is None:
+            return self.analyze_many(texts, mode)
+        
+        start_time = time.time()
+        fingerprint = self.cache_fingerprint(mode, neural)
+        results = [None] * len(texts)
+        misses = {}
+        
+        for index, text in enumerate(texts):
+            cache_key = self.result_cache.make_key(text, fingerprint)
+            result, tier = self.result_cache.get(cache_key)
+            if result is not None:
+                log(LOG_DEBUG, "💨 Result cache hit (%s)", tier)
+                result['processing_time'] = int((time.time() - start_time) * 1000)
+                result['cache'] = {'hit': True, 'tier': tier}
+                results[index] = result
+            else:
+                misses.setdefault(cache_key, []).append(index)
+        
+        # Identical texts inside one batch are analyzed once
+        if misses:
+            analyzed = self.analyze_many([texts[indexes[0]] for indexes in misses.values()], mode)
+            for (cache_key, indexes), result in zip(misses.items(), analyzed):
+                self.result_cache.put(cache_key, result)
+                result['cache'] = {'hit': False, 'tier': None}
+                for index in indexes:
+                    results[index] = result if index == indexes[0] else json.loads(json.dumps(result))
+        
+        stats = self.result_cache.stats()
+        for result in results:
+            result['cache'].update(stats)
+        return results
+    
+    def detect_stream(self, text, mode=None):
+        """Detect section by section, yielding one message per section and the document result last
+        
+        Each section goes through detect_many on its own, so chunk and sentence
+        structures only ever exist for one section at a time. Section messages
+        carry the running document-level probability; the final `result` message
+        is the same shape as a detect() result plus a `sections` count.
+        """
         start_time = time.time()
+        mode, neural = self.resolve_mode(mode)
+        aggregate = SectionAggregate()
+        
+        for index, (start, end, word_count) in enumerate(self.split_into_sections(text)):
+            section = self.detect_many([text[start:end]], mode)[0]
+            aggregate.add(section, end - start, word_count)
+            running = self.score_document(aggregate.analysis(), mode, neural)
+            yield {
+                'type': 'section',
+                'index': index,
+                'start': start,
+                'end': end,
+                'word_count': word_count,
+                'probability': section['probability'],
+                'confidence': section['confidence'],
+                'stages_run': section['breakdown']['stages_run'],
+                'running': {
+                    'sections': aggregate.sections,
+                    'word_count': aggregate.word_count,
+                    'probability': running['probability']
+                }
+            }
+        
+        result = self.score_document(aggregate.analysis(), mode, neural)
+        result['sections'] = aggregate.sections
+        result['processing_time'] = int((time.time() - start_time) * 1000)
+        yield {'type': 'result', 'result': result}
+    
+    def split_into_sections(self, text, section_words=None):
+        """Yield (start, end, word_count) spans of consecutive paragraphs with >= section_words words
+        
+        Paragraphs longer than a section are cut at sentence ends so one huge
+        block of text cannot become one unbounded section.
+        """
+        section_words = section_words or self.section_words
+        section_start = None
+        section_end = 0
+        words = 0
         
-        # 1. Statistical Analysis (enhanced existing method)
-        statistical_features = self.extract_statistical_features(text)
-        statistical_score = self.calculate_statistical_probability(statistical_features)
+        for start, end, piece_words in self.iter_text_pieces(text, section_words):
+            if section_start is None:
+                section_start = start
+            section_end = end
+            words += piece_words
+            if words >= section_words:
+                yield section_start, section_end, words
+                section_start = None
+                words = 0
         
-        # 2. Neural Analysis (advanced methods)
-        if self.neural_ready:
-            print("🧠 Performing neural analysis...", file=sys.stderr)
-            perplexity_score = self.calculate_perplexity_score(text)
-            coherence_score = self.analyze_semantic_coherence(text)
-            neural_embedding_score = self.analyze_neural_embeddings(text)
+        if section_start is not None:
+            yield section_start, section_end, words
+    
+    def iter_text_pieces(self, text, max_words):
+        """Yield (start, end, word_count) for each non-empty paragraph, long ones cut at sentence ends"""
+        position = 0
+        while position < len(text):
+            end = text.find(PARAGRAPH_SEPARATOR, position)
+            if end == -1:
+                end = len(text)
+            
+            piece_start = position
+            words = 0
+            for boundary in SENTENCE_BOUNDARY_PATTERN.finditer(text, position, end):
+                words += len(WORD_PATTERN.findall(text, position, boundary.end()))
+                position = boundary.end()
+                if words >= max_words:
+                    yield piece_start, position, words
+                    piece_start = position
+                    words = 0
+            
+            words += len(WORD_PATTERN.findall(text, position, end))
+            if words:
+                yield piece_start, end, words
+            position = end + len(PARAGRAPH_SEPARATOR)
+    
+    @contextmanager
+    def timed(self, timings, stage, share=1):
+        """Record the wall time (ms) of a stage into `timings`, plus its tracemalloc peak when enabled
+        
+        A stage run once for a batch of `share` documents is split evenly among them,
+        so per-document timings add up to the real total. Memory peaks are the rise
+        over the allocation at the start of the stage and only cover Python
+        allocations, not torch tensor storage.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[stage] = round((time.perf_counter() - started) * 1000 / share, 3)
+            if self.trace_memory:
+                peak_kb = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+                timings.setdefault('memory_peak_kb', {})[stage] = peak_kb
+    
+    @staticmethod
+    def merge_timings(timings, batch_timings, into=None):
+        """Copy a shared batch's stage timing (and memory peak) into one document's timings
+        
+        With `into`, the batch time is added to that already recorded stage instead.
+        """
+        for stage, value in batch_timings.items():
+            if stage == 'memory_peak_kb':
+                peaks = timings.setdefault('memory_peak_kb', {})
+                for peak_stage, peak in value.items():
+                    key = into or peak_stage
+                    peaks[key] = max(peaks.get(key, 0), peak)
+            elif into:
+                timings[into] = round(timings[into] + value, 3)
+            else:
+                timings[stage] = value
+    
+    def write_trace(self, results, mode):
+        """Append one JSON line of stage timings per result to the trace file"""
+        try:
+            with open(self.trace_file, 'a', encoding='utf-8') as f:
+                for result in results:
+                    f.write(json.dumps({
+                        'timestamp': time.time(),
+                        'pid': os.getpid(),
+                        'mode': mode,
+                        'probability': result['probability'],
+                        'stages_run': result['breakdown']['stages_run'],
+                        'processing_time': result['processing_time'],
+                        'timings': result['breakdown']['timings']
+                    }) + '\n')
+        except OSError as e:
+            log(LOG_ERROR, f"⚠️ Failed to write trace file: {e}")
+    
+    def analyze(self, text, mode=None):
+        """Run every detection stage on the text"""
+        return self.analyze_many([text], mode)[0]
+    
+    def analyze_many(self, texts, mode=None, sample=True):
+        """Run every detection stage on several texts with shared neural batches
+        
+        In cascade mode the neural stages only run for documents whose interim
+        probability still falls inside the uncertainty band around 50: GPT-2
+        perplexity first, then the MiniLM coherence and embedding stages.
+        Texts over the sampling threshold go through analyze_sampled instead.
+        """
+        start_time = time.time()
+        mode, neural = self.resolve_mode(mode)
+        
+        if sample and self.sample_threshold:
+            sampled = [index for index, text in enumerate(texts) if len(text) > self.sample_threshold]
+            if sampled:
+                results = [None] * len(texts)
+                for index in sampled:
+                    results[index] = self.analyze_sampled(texts[index], mode)
+                rest = [index for index, result in enumerate(results) if result is None]
+                for index, result in zip(rest, self.analyze_many([texts[i] for i in rest], mode, sample=False)):
+                    results[index] = result
+                return results
+        
+        # Tokenize once; every analyzer reads from the shared profile
+        timings = [{} for _ in texts]
+        profiles = []
+        for text, document_timings in zip(texts, timings):
+            with self.timed(document_timings, 'tokenize'):
+                profiles.append(TextProfile(text))
+        
+        # 1. Statistical + 3. Writing Style Analysis (cheap, always run)
+        analyses = [self.analyze_base(profile, document_timings) for profile, document_timings in zip(profiles, timings)]
+        
+        # 2. Neural Analysis (advanced methods), batched across all documents
+        if neural:
+            pending = self.select_uncertain(analyses) if mode == 'cascade' else list(range(len(analyses)))
+            if pending:
+                log(LOG_DEBUG, "🧠 Performing perplexity analysis on %d document(s)...", len(pending))
+                batch_timings = {}
+                with self.timed(batch_timings, 'perplexity', share=len(pending)):
+                    perplexity_results = self.analyze_perplexity_many([profiles[i] for i in pending])
+                for index, (score, sentences, reuse) in zip(pending, perplexity_results):
+                    self.merge_timings(timings[index], batch_timings)
+                    analyses[index]['scores']['perplexity'] = score
+                    analyses[index]['sentence_perplexity'] = sentences
+                    self.record_reuse(analyses[index], 'perplexity', reuse)
+            
+            if mode == 'cascade':
+                pending = self.select_uncertain([analyses[i] for i in pending], pending)
+            if pending:
+                log(LOG_DEBUG, "🧠 Performing embedding analysis on %d document(s)...", len(pending))
+                # One MiniLM pass shared by the coherence and embedding analyzers; the
+                # `embedding` timing includes each document's share of that pass
+                batch_timings = {}
+                reuse = []
+                with self.timed(batch_timings, 'encode', share=len(pending)):
+                    sentence_embeddings = self.embed_sentences_many([profiles[i] for i in pending], reuse)
+                for index, embeddings, document_reuse in zip(pending, sentence_embeddings, reuse):
+                    self.record_reuse(analyses[index], 'embedding', document_reuse)
+                    scores = analyses[index]['scores']
+                    with self.timed(timings[index], 'coherence'):
+                        scores['coherence'] = self.analyze_semantic_coherence(profiles[index], embeddings)
+                    with self.timed(timings[index], 'embedding'):
+                        scores['neural_embedding'] = self.analyze_neural_embeddings(profiles[index], embeddings)
+                    self.merge_timings(timings[index], batch_timings, into='embedding')
+        elif mode == 'fast':
+            log(LOG_DEBUG, "⚡ Fast mode, using statistical + style")
         else:
-            print("📊 Neural models unavailable, using statistical + style", file=sys.stderr)
-            perplexity_score = 50
-            coherence_score = 50
-            neural_embedding_score = 50
-        
-        # 3. Writing Style Analysis (new advanced method)
-        print("✍️ Analyzing writing style patterns...", file=sys.stderr)
-        style_score = self.analyze_writing_style(text)
-        
-        # 4. Ensemble Prediction (combine all methods)
-        ensemble_scores = {
-            'statistical': statistical_score,
-            'perplexity': perplexity_score,
-            'coherence': coherence_score,
-            'neural_embedding': neural_embedding_score,
-            'writing_style': style_score
+            log(LOG_DEBUG, "📊 Neural models unavailable, using statistical + style")
+        
+        results = [self.score_document(analysis, mode, neural) for analysis in analyses]
+        
+        processing_time = int((time.time() - start_time) * 1000)
+        for result in results:
+            result['processing_time'] = processing_time
+        if self.trace_file:
+            self.write_trace(results, mode)
+        return results
+    
+    @staticmethod
+    def record_reuse(analysis, stage, reuse):
+        """Add one stage's (sentences reused, sentences) from the sentence cache to an analysis"""
+        if reuse is None:
+            return
+        report = analysis.setdefault('sentence_reuse', {'fraction': 0.0})
+        report[stage] = {'reused': reuse[0], 'sentences': reuse[1]}
+        stages = [report[name] for name in ('perplexity', 'embedding') if name in report]
+        total = sum(entry['sentences'] for entry in stages)
+        report['fraction'] = round(sum(entry['reused'] for entry in stages) / total, 3) if total else 0.0
+    
+    def analyze_sampled(self, text, mode=None):
+        """Estimate the result of a long text from a stratified sample of its sections
+        
+        The sampled sections are analyzed together (shared neural batches) and
+        combined word-weighted like streamed sections. `sampling` reports the
+        coverage and a normal-approximation confidence interval from the spread
+        of the section probabilities, with a finite population correction.
+        """
+        start_time = time.time()
+        mode, neural = self.resolve_mode(mode)
+        spans = self.pick_sample_sections(text)
+        if not any(word_count for _, _, word_count in spans):
+            # Nothing to extrapolate from (e.g. a wall of punctuation): score the whole text
+            log(LOG_DEBUG, "🎲 Sampled sections have no words, analyzing the full text")
+            return self.analyze_many([text], mode, sample=False)[0]
+        log(LOG_DEBUG, "🎲 Sampling %d sections of a %d character text...", len(spans), len(text))
+        
+        aggregate = SectionAggregate()
+        sections = self.analyze_many([text[start:end] for start, end, _ in spans], mode, sample=False)
+        for section, (start, end, word_count) in zip(sections, spans):
+            aggregate.add(section, end - start, word_count)
+        
+        # Document size is extrapolated from the sample so nothing scans the whole text
+        sampled_chars = sum(end - start for start, end, _ in spans)
+        estimated_words = max(int(aggregate.word_count * len(text) / max(sampled_chars, 1)), aggregate.word_count)
+        analysis = aggregate.analysis()
+        analysis['text_length'] = len(text)
+        analysis['word_count'] = estimated_words
+        result = self.score_document(analysis, mode, neural)
+        
+        probabilities = np.array([section['probability'] for section in sections])
+        word_fraction = aggregate.word_count / estimated_words
+        if len(probabilities) > 1:
+            margin = SAMPLE_CONFIDENCE_Z * np.std(probabilities, ddof=1) / math.sqrt(len(probabilities))
+            margin *= math.sqrt(max(0.0, 1 - word_fraction))
+        else:
+            margin = 50.0
+        result['sampling'] = {
+            'sections': len(spans),
+            'strata': self.sample_sections,
+            'sampled_words': aggregate.word_count,
+            'estimated_words': estimated_words,
+            'coverage': round(word_fraction, 3),
+            'confidence_interval': [
+                round(max(0.0, result['probability'] - margin), 1),
+                round(min(100.0, result['probability'] + margin), 1)
+            ],
+            'section_probabilities': probabilities.tolist()
         }
+        result['processing_time'] = int((time.time() - start_time) * 1000)
+        return result
+    
+    def pick_sample_sections(self, text):
+        """(start, end, word_count) of one section per equal-size character stratum of the text
+        
+        Each stratum contributes the first section after a seeded random offset,
+        moved to the next sentence end. Scans are capped at section_words *
+        SAMPLE_CHARS_PER_WORD characters per stratum, which bounds the work.
+        """
+        strata = self.sample_sections
+        reach = self.section_words * SAMPLE_CHARS_PER_WORD
+        rng = np.random.default_rng(len(text))  # same text, same sample
+        spans = []
         
-        raw_probability = self.ensemble_prediction(ensemble_scores)
+        for stratum in range(strata):
+            low = len(text) * stratum // strata
+            high = len(text) * (stratum + 1) // strata
+            offset = low + int(rng.integers(0, max(high - low - reach, 0) + 1))
+            if offset > low:
+                boundary = SENTENCE_BOUNDARY_PATTERN.search(text, offset, min(offset + reach, high))
+                if boundary:
+                    offset = boundary.end()
+            
+            window = text[offset:min(offset + reach, high)]
+            section = next(self.split_into_sections(window), None)
+            if section is not None:
+                start, end, word_count = section
+                spans.append((offset + start, offset + end, word_count))
+        return spans
+    
+    def analyze_base(self, profile, timings=None):
+        """Statistical and writing-style stages that every mode runs"""
+        timings = {} if timings is None else timings
+        log(LOG_DEBUG, "🔍 Analyzing text: %s...", profile.text[:50])
         
-        # 5. Enhanced Calibration based on text characteristics
-        word_count = len(self.tokenize_words(text))
-        ai_probability = self.calibrate_prediction(raw_probability, len(text), word_count)
+        with self.timed(timings, 'statistical'):
+            statistical_features = self.extract_statistical_features(profile)
+            statistical_score = self.calculate_statistical_probability(statistical_features)
         
-        # 6. Enhanced Confidence calculation
-        confidence = self.calculate_confidence(ai_probability, ensemble_scores)
+        log(LOG_DEBUG, "✍️ Analyzing writing style patterns...")
+        with self.timed(timings, 'style'):
+            style_score = self.analyze_writing_style(profile)
         
-        processing_time = int((time.time() - start_time) * 1000)
+        return {
+            'profile': profile,
+            'text_length': len(profile.text),
+            'word_count': len(profile.words),
+            'phrase_counts': self.count_phrases(profile),
+            'statistical_features': statistical_features,
+            'scores': {
+                'statistical': statistical_score,
+                'writing_style': style_score
+            },
+            'timings': timings
+        }
+    
+    def stage_probability(self, profile, scores):
+        """Calibrated probability from whichever stage scores are available"""
+        raw_probability = self.ensemble_prediction(scores, stages=list(scores))
+        return self.calibrate_prediction(raw_probability, len(profile.text), len(profile.words))
+    
+    def select_uncertain(self, analyses, indexes=None):
+        """Indexes of the analyses whose interim probability is inside the cascade band"""
+        indexes = list(range(len(analyses))) if indexes is None else indexes
+        return [
+            index for index, analysis in zip(indexes, analyses)
+            if abs(self.stage_probability(analysis['profile'], analysis['scores']) - 50) <= self.cascade_band
+        ]
+    
+    def score_document(self, analysis, mode, neural):
+        """Combine the stage scores of one document into the final result"""
+        statistical_features = analysis['statistical_features']
+        stages_run = [stage for stage in ENSEMBLE_STAGES if stage in analysis['scores']]
+        
+        # 4. Ensemble Prediction (combine all methods; skipped stages report neutral 50)
+        ensemble_scores = {stage: analysis['scores'].get(stage, 50) for stage in ENSEMBLE_STAGES}
+        statistical_score = ensemble_scores['statistical']
+        perplexity_score = ensemble_scores['perplexity']
+        coherence_score = ensemble_scores['coherence']
+        neural_embedding_score = ensemble_scores['neural_embedding']
+        style_score = ensemble_scores['writing_style']
         
-        print(f"🎯 Advanced hybrid detection complete: {ai_probability}%", file=sys.stderr)
+        timings = dict(analysis.get('timings', {}))
+        with self.timed(timings, 'ensemble'):
+            raw_probability = self.ensemble_prediction(ensemble_scores, stages=stages_run)
+            
+            # 5. Enhanced Calibration based on text characteristics
+            word_count = analysis['word_count']
+            ai_probability = self.calibrate_prediction(raw_probability, analysis['text_length'], word_count)
+            
+            # 6. Enhanced Confidence calculation (a cascade only judges agreement of the stages it ran;
+            # a streamed text without words has no stages and falls back to the neutral scores)
+            if mode == 'cascade' and stages_run:
+                confidence = self.calculate_confidence(ai_probability, {stage: ensemble_scores[stage] for stage in stages_run})
+            else:
+                confidence = self.calculate_confidence(ai_probability, ensemble_scores)
+        
+        log(LOG_DEBUG, "🎯 Advanced hybrid detection complete: %s%%", ai_probability)
         
         # Enhanced output format with complete analysis breakdown
         return {
             'probability': round(ai_probability, 1),
             'confidence': confidence,
             'breakdown': {
-                'transformer_score': perplexity_score if self.neural_ready else None,
+                'transformer_score': perplexity_score if neural else None,
                 'statistical_score': round(statistical_score, 1),
                 'feature_breakdown': {k: round(v, 1) for k, v in statistical_features.items()},
+                'phrase_counts': dict(analysis['phrase_counts']),
                 'neural_breakdown': {
                     'perplexity_score': round(perplexity_score, 1),
                     'coherence_score': round(coherence_score, 1),
@@ -142,63 +1282,324 @@ class HybridNeuralAIDetector:
                     'style_score': round(style_score, 1),
                     'ensemble_score': round(raw_probability, 1)
                 },
+                'stages_run': stages_run,
+                'sentence_perplexity': analysis.get('sentence_perplexity'),
+                'sentence_reuse': analysis.get('sentence_reuse'),
+                'timings': timings,
                 'method': 'Advanced Hybrid Neural + Statistical + Style Analysis'
             },
             'model_info': {
-                'transformer_available': self.neural_ready,
-                'model_name': 'GPT-2 + SentenceTransformer + Statistical + Style' if self.neural_ready else 'Enhanced Statistical + Style',
-                'fallback_mode': not self.neural_ready,
-                'method': 'Advanced Hybrid Detection v2.0' if self.neural_ready else 'Enhanced Statistical + Style Detection v2.0'
+                'transformer_available': neural,
+                'model_name': 'GPT-2 + SentenceTransformer + Statistical + Style' if neural else 'Enhanced Statistical + Style',
+                'fallback_mode': not neural,
+                'mode': mode,
+                'inference_profile': self.inference_profile if neural else None,
+                'method': 'Advanced Hybrid Detection v2.0' if neural else 'Enhanced Statistical + Style Detection v2.0'
             },
-            'processing_time': processing_time
+            'processing_time': 0  # filled in by analyze_many
         }
     
     # PHASE 2: ADVANCED PERPLEXITY ANALYSIS
-    def split_into_chunks(self, text, max_length=256):
-        """Split text into smaller chunks for better perplexity analysis"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
+    def encode_for_perplexity(self, text):
+        """GPT-2 token ids of the text and the (start, end) character span of each token"""
+        encoding = self.gpt2_tokenizer(text, add_special_tokens=False,
+                                       return_offsets_mapping=True, verbose=False)
+        return encoding['input_ids'], encoding['offset_mapping']
+    
+    def split_into_chunks(self, text, max_length=None, stride=None, encoding=None):
+        """Tokenize the text once and cut the token IDs into fixed-size windows
+        
+        Windows start every `stride` tokens and hold up to `max_length` tokens.
+        Tokens already scored by the previous window are kept only as context
+        (`score_from`), so overlapping windows never count a token twice. The last
+        window is aligned to the end of the text to use the full context.
+        `start`/`end` are character offsets of the window in the original text,
+        `offsets` the (start, end) character span of each of its tokens and
+        `first_token` the index of its first token in the text.
+        """
+        max_length = min(max_length or self.chunk_tokens, self.gpt2_model.config.n_positions)
+        stride = min(stride or self.chunk_stride, max_length)
         
-        for word in words:
-            current_chunk.append(word)
-            if len(' '.join(current_chunk)) > max_length:
-                chunks.append(' '.join(current_chunk[:-1]))
-                current_chunk = [word]
+        token_ids, offsets = encoding or self.encode_for_perplexity(text)
+        total = len(token_ids)
         
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+        windows = []
+        scored_until = 0
+        begin = 0
+        while scored_until < total:
+            end = min(begin + max_length, total)
+            if end == total:
+                begin = max(0, total - max_length)
+            windows.append({
+                'input_ids': token_ids[begin:end],
+                'score_from': scored_until - begin,
+                'start': offsets[begin][0],
+                'end': offsets[end - 1][1],
+                'offsets': offsets[begin:end],
+                'first_token': begin
+            })
+            scored_until = end
+            begin += stride
         
-        return chunks if chunks else [text]
+        return windows
     
-    def calculate_perplexity_score(self, text):
+    def calculate_perplexity_score(self, profile):
         """Enhanced perplexity calculation with chunking - KEY AI DETECTION METRIC"""
+        return self.calculate_perplexity_scores([profile])[0]
+    
+    def calculate_perplexity_scores(self, profiles):
+        """Perplexity scores for several documents, batching all of their windows together"""
+        return [score for score, _, _ in self.analyze_perplexity_many(profiles)]
+    
+    def analyze_perplexity_many(self, profiles):
+        """(perplexity score, sentence-level report, sentence reuse) per document from one batched GPT-2 pass
+        
+        The sentence-level report (see sentence_perplexities) reuses the per-token
+        losses of the same forward passes, so it costs no extra model calls. With
+        the sentence cache, only sentences without cached losses go to GPT-2 (see
+        plan_perplexity) and every window's perplexity is rebuilt from cached and
+        fresh token losses. Reuse is (sentences reused, sentences), None without
+        a cache.
+        """
         if not self.neural_ready:
-            return 50
+            return [(50, None, None)] * len(profiles)
         
         try:
-            # Split text into manageable chunks for better analysis
-            chunks = self.split_into_chunks(text, max_length=256)
-            perplexities = []
+            # Split every text into full-context token windows for better analysis
+            plans = [self.plan_perplexity(profile) for profile in profiles]
+            run_perplexities = iter(self.calculate_chunk_perplexities([
+                window for plan in plans for window in plan['run']
+            ]))
+            
+            results = []
+            for profile, plan in zip(profiles, plans):
+                windows = plan['windows']
+                perplexities = [next(run_perplexities) for _ in plan['run']]
+                if plan['losses'] is not None:
+                    perplexities = self.assemble_window_perplexities(plan, perplexities)
+                perplexities = [perplexity for perplexity in perplexities if perplexity is not None]
+                reuse = (plan['reused'], len(plan['units'])) if plan['losses'] is not None else None
+                
+                if not perplexities:
+                    results.append((50, None, reuse))
+                    continue
+                
+                # Average perplexity across all chunks for robust scoring
+                avg_perplexity = np.mean(perplexities)
+                log(LOG_DEBUG, "🔢 Average perplexity across %d chunks: %.2f", len(perplexities), avg_perplexity)
+                
+                # Enhanced scoring with tighter thresholds
+                results.append((
+                    self.map_perplexity_to_score(avg_perplexity),
+                    self.sentence_perplexities(profile, windows),
+                    reuse
+                ))
+            return results
+            
+        except Exception as e:
+            log(LOG_ERROR, f"❌ Enhanced perplexity calculation failed: {e}")
+            return [(50, None, None)] * len(profiles)
+    
+    def plan_perplexity(self, profile):
+        """Scoring windows of a document and the windows GPT-2 actually has to run for it
+        
+        Without cached sentences the run is the scoring windows themselves. When
+        some sentences' losses are cached, each stretch of uncached sentences is
+        run instead, in pieces of half a window, each preceded by as much of the
+        text before it as fits into a window as context.
+        """
+        encoding = self.encode_for_perplexity(profile.text)
+        windows = self.split_into_chunks(profile.text, encoding=encoding)
+        plan = {'windows': windows, 'run': windows, 'losses': None}
+        if self.sentence_cache is None:
+            return plan
+        
+        token_ids, offsets = encoding
+        units = self.sentence_token_units(profile, offsets)
+        losses = np.full(len(token_ids), np.nan, dtype=np.float32)
+        cached = []
+        for begin, end in units:
+            unit_losses = self.sentence_cache.get(self.sentence_cache.losses_key(token_ids[begin:end]))
+            if unit_losses is not None and begin > 0 and np.isnan(unit_losses[0]):
+                unit_losses = None  # cached from the start of a text, so its first token was never scored
+            cached.append(unit_losses is not None)
+            if unit_losses is not None:
+                losses[begin:end] = unit_losses
+        plan.update({'token_ids': token_ids, 'units': units, 'cached': cached, 'losses': losses,
+                     'reused': sum(cached)})
+        if not plan['reused']:
+            return plan
+        
+        max_length = min(self.chunk_tokens, self.gpt2_model.config.n_positions)
+        piece = max(1, max_length // 2)
+        run = []
+        for (begin, end), is_cached in zip(units, cached):
+            if is_cached:
+                continue
+            if run and run[-1]['stop'] == begin:  # extend a stretch of consecutive changed sentences
+                run[-1]['stop'] = end
+            else:
+                run.append({'start': begin, 'stop': end})
+        
+        plan['run'] = []
+        for stretch in run:
+            position = stretch['start']
+            while position < stretch['stop']:
+                stop = min(position + piece, stretch['stop'])
+                context_begin = max(0, stop - max_length)
+                plan['run'].append({
+                    'input_ids': token_ids[context_begin:stop],
+                    'score_from': position - context_begin,
+                    'first_token': context_begin
+                })
+                position = stop
+        return plan
+    
+    def assemble_window_perplexities(self, plan, run_perplexities):
+        """Fill a plan's token losses from its run, cache complete sentences, and score its windows
+        
+        Returns the perplexity of every scoring window; when the run was the
+        scoring windows themselves their perplexities are kept as computed.
+        """
+        losses = plan['losses']
+        for window in plan['run']:
+            if window.get('token_losses') is not None:
+                first = window['first_token'] + max(window['score_from'], 1)
+                losses[first:window['first_token'] + len(window['input_ids'])] = window['token_losses']
+        
+        # The first token of a text is never scored, so it does not make a sentence incomplete
+        token_ids = plan['token_ids']
+        for (begin, end), is_cached in zip(plan['units'], plan['cached']):
+            if not is_cached and not np.isnan(losses[max(begin, 1):end]).any():
+                self.sentence_cache.put(self.sentence_cache.losses_key(token_ids[begin:end]), losses[begin:end].copy())
+        
+        if plan['run'] is plan['windows']:
+            return run_perplexities
+        
+        perplexities = []
+        for window in plan['windows']:
+            first = window['first_token'] + max(window['score_from'], 1)
+            window_losses = losses[first:window['first_token'] + len(window['input_ids'])]
+            if not len(window_losses):
+                perplexities.append(None)
+                continue
+            window['token_losses'] = window_losses
+            perplexities.append(math.exp(float(np.mean(window_losses))))
+        return perplexities
+    
+    @staticmethod
+    def sentence_token_units(profile, offsets):
+        """Token range [begin, end) of each sentence, assigning tokens by their last character
+        
+        Tokens before the first sentence and between sentences belong to the
+        preceding sentence, as in sentence_perplexities.
+        """
+        if not offsets:
+            return []
+        sentence_starts = np.array([start for start, _ in profile.sentence_spans] or [0])
+        positions = np.array([end - 1 for _, end in offsets])
+        owners = np.maximum(np.searchsorted(sentence_starts, positions, side='right') - 1, 0)
+        edges = [0, *(np.flatnonzero(np.diff(owners)) + 1).tolist(), len(offsets)]
+        return list(zip(edges[:-1], edges[1:]))
+    
+    def sentence_perplexities(self, profile, windows):
+        """Per-sentence perplexity, its spread ("burstiness") and a highlight list for the UI
+        
+        Every scored token is assigned to the sentence containing its last
+        character (boundary punctuation goes to the sentence it ends). Each
+        highlight carries the sentence's character span, perplexity and the score
+        map_perplexity_to_score gives it; burstiness is the coefficient of
+        variation of sentence perplexities, as human writing mixes easy and
+        surprising sentences more than generated text does.
+        """
+        positions = []
+        losses = []
+        for window in windows:
+            if window.get('token_losses') is None:
+                continue
+            first = max(window['score_from'], 1)
+            positions.extend(end - 1 for _, end in window['offsets'][first:])
+            losses.append(window['token_losses'])
+        if not positions or not profile.sentence_spans:
+            return None
+        
+        sentence_starts = np.array([start for start, _ in profile.sentence_spans])
+        owners = np.maximum(np.searchsorted(sentence_starts, np.array(positions), side='right') - 1, 0)
+        counts = np.bincount(owners, minlength=len(sentence_starts))
+        loss_sums = np.bincount(owners, weights=np.concatenate(losses), minlength=len(sentence_starts))
+        
+        highlights = []
+        for index in np.flatnonzero(counts >= SENTENCE_MIN_TOKENS):
+            perplexity = math.exp(loss_sums[index] / counts[index])
+            start, end = profile.sentence_spans[index]
+            highlights.append({
+                'index': int(index),
+                'start': start,
+                'end': end,
+                'tokens': int(counts[index]),
+                'perplexity': round(perplexity, 2),
+                'score': self.map_perplexity_to_score(perplexity)
+            })
+        if not highlights:
+            return None
+        
+        perplexities = np.array([highlight['perplexity'] for highlight in highlights])
+        mean_perplexity = float(np.mean(perplexities))
+        return {
+            'sentences_scored': len(highlights),
+            'mean_perplexity': round(mean_perplexity, 2),
+            'perplexity_variance': round(float(np.var(perplexities)), 2),
+            'burstiness': round(float(np.std(perplexities)) / mean_perplexity, 3) if mean_perplexity else 0.0,
+            'highlights': highlights
+        }
+    
+    def calculate_chunk_perplexities(self, windows):
+        """Perplexity of every token window, scoring padded batches of windows per forward pass
+        
+        Windows are batched by length to minimise padding; the returned list follows
+        the input order and holds None for windows with nothing to predict.
+        """
+        perplexities = [None] * len(windows)
+        pad_token_id = self.gpt2_tokenizer.pad_token_id
+        order = sorted(range(len(windows)), key=lambda i: len(windows[i]['input_ids']))
+        
+        for start in range(0, len(order), self.perplexity_batch_size):
+            batch_indexes = order[start:start + self.perplexity_batch_size]
+            batch = [windows[i] for i in batch_indexes]
+            width = max(len(window['input_ids']) for window in batch)
             
-            for chunk in chunks:
-                inputs = self.gpt2_tokenizer(chunk, return_tensors='pt', truncation=True, max_length=256)
-                with torch.no_grad():
-                    outputs = self.gpt2_model(**inputs, labels=inputs['input_ids'])
-                    loss = outputs.loss
-                    perplexity = torch.exp(loss).item()
-                    perplexities.append(perplexity)
+            input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+            score_mask = torch.zeros((len(batch), width))
+            for row, window in enumerate(batch):
+                length = len(window['input_ids'])
+                input_ids[row, :length] = torch.tensor(window['input_ids'], dtype=torch.long)
+                attention_mask[row, :length] = 1
+                # The first token has no left context and context-only tokens were scored before
+                score_mask[row, max(window['score_from'], 1):length] = 1
             
-            # Average perplexity across all chunks for robust scoring
-            avg_perplexity = np.mean(perplexities)
-            print(f"🔢 Average perplexity across {len(chunks)} chunks: {avg_perplexity:.2f}", file=sys.stderr)
+            with torch.inference_mode():
+                logits = self.gpt2_model(input_ids=input_ids, attention_mask=attention_mask).logits
             
-            # Enhanced scoring with tighter thresholds
-            return self.map_perplexity_to_score(avg_perplexity)
+            # Per-sequence mean loss over the scored next-token predictions
+            shift_logits = logits[:, :-1, :]
+            shift_labels = input_ids[:, 1:]
+            shift_mask = score_mask[:, 1:].to(shift_logits.dtype)
+            token_loss = torch.nn.functional.cross_entropy(
+                shift_logits.transpose(1, 2), shift_labels, reduction='none'
+            )
+            token_counts = shift_mask.sum(dim=1)
+            sequence_loss = (token_loss * shift_mask).sum(dim=1) / token_counts.clamp(min=1)
             
-        except Exception as e:
-            print(f"❌ Enhanced perplexity calculation failed: {e}", file=sys.stderr)
-            return 50
+            for row, (index, loss, count) in enumerate(zip(batch_indexes, sequence_loss.tolist(), token_counts.tolist())):
+                if count > 0:  # single-token windows have nothing to predict
+                    perplexities[index] = math.exp(loss)
+                    # Keep the scored tokens' losses for the sentence-level report
+                    window = windows[index]
+                    first = max(window['score_from'], 1)
+                    window['token_losses'] = token_loss[row, first - 1:len(window['input_ids']) - 1].float().numpy()
+        
+        return perplexities
     
     def map_perplexity_to_score(self, avg_perplexity):
         """Convert average perplexity to AI probability score with enhanced thresholds"""
@@ -216,26 +1617,24 @@ class HybridNeuralAIDetector:
             return 10  # Almost certainly human - very high perplexity
     
     # PHASE 3: WRITING STYLE ANALYSIS
-    def analyze_writing_style(self, text):
+    def analyze_writing_style(self, profile):
         """Analyze writing style patterns specific to AI vs human writing"""
         try:
-            sentences = self.tokenize_sentences(text)
-            if len(sentences) < 3:
+            if len(profile.sentences) < 3:
                 return 50
             
             # 1. Sentence starter variety (AI tends to be more repetitive)
-            starters = [s.split()[0].lower() for s in sentences if s.split()]
+            starters = profile.sentence_starters
             starter_diversity = len(set(starters)) / len(starters) if starters else 0.5
             
             # 2. Punctuation patterns analysis
-            punct_variety_score = self.analyze_punctuation_variety(text)
+            punct_variety_score = self.analyze_punctuation_variety(profile)
             
             # 3. Paragraph structure uniformity
-            paragraphs = text.split('\n\n')
-            paragraph_uniformity_score = self.analyze_paragraph_uniformity(paragraphs)
+            paragraph_uniformity_score = self.analyze_paragraph_uniformity(profile)
             
             # 4. Word choice sophistication patterns
-            sophistication_score = self.analyze_word_sophistication(text)
+            sophistication_score = self.analyze_word_sophistication(profile)
             
             # Combine all style indicators with optimized weights
             style_score = (
@@ -245,30 +1644,31 @@ class HybridNeuralAIDetector:
                 sophistication_score * 25        # Consistent sophistication = AI-like
             )
             
-            print(f"✍️ Style analysis - starters: {starter_diversity:.2f}, punct: {punct_variety_score:.1f}, para: {paragraph_uniformity_score:.1f}, soph: {sophistication_score:.1f}", file=sys.stderr)
+            log(LOG_DEBUG, "✍️ Style analysis - starters: %.2f, punct: %.1f, para: %.1f, soph: %.1f",
+                starter_diversity, punct_variety_score, paragraph_uniformity_score, sophistication_score)
             
             return min(100, max(0, style_score))
             
         except Exception as e:
-            print(f"❌ Style analysis failed: {e}", file=sys.stderr)
+            log(LOG_ERROR, f"❌ Style analysis failed: {e}")
             return 50
     
-    def analyze_punctuation_variety(self, text):
+    def analyze_punctuation_variety(self, profile):
         """AI tends to use limited punctuation variety"""
         punct_chars = ['.', ',', '!', '?', ';', ':', '-', '(', ')', '"', "'"]
-        used_punct = sum(1 for p in punct_chars if p in text)
+        used_punct = sum(1 for p in punct_chars if p in profile.text)
         max_punct = len(punct_chars)
         
         variety_ratio = used_punct / max_punct
         # Lower variety suggests AI (inverted scoring)
         return max(0, (0.7 - variety_ratio) * 100)
     
-    def analyze_paragraph_uniformity(self, paragraphs):
+    def analyze_paragraph_uniformity(self, profile):
         """AI paragraphs tend to be more uniform in length"""
-        if len(paragraphs) < 2:
+        if len(profile.paragraph_spans) < 2:
             return 50
         
-        lengths = [len(p.split()) for p in paragraphs if p.strip()]
+        lengths = profile.paragraph_word_counts
         if not lengths:
             return 50
         
@@ -282,15 +1682,15 @@ class HybridNeuralAIDetector:
         # Lower variation = more uniform = more AI-like
         return max(0, min(100, (0.5 - cv) * 200))
     
-    def analyze_word_sophistication(self, text):
+    def analyze_word_sophistication(self, profile):
         """Analyze vocabulary sophistication consistency patterns"""
-        words = self.tokenize_words(text)
+        words = profile.words
         if len(words) < 20:
             return 50
         
         # Count sophisticated words (7+ characters)
-        long_words = [w for w in words if len(w) >= 7]
-        sophistication_ratio = len(long_words) / len(words)
+        long_words = np.count_nonzero(profile.word_lengths >= 7)
+        sophistication_ratio = long_words / len(words)
         
         # AI often maintains consistent vocabulary sophistication
         if sophistication_ratio > 0.35:
@@ -302,31 +1702,89 @@ class HybridNeuralAIDetector:
         else:
             return 25  # Low sophistication - more human-like
     
-    def analyze_semantic_coherence(self, text):
+    def embed_sentences(self, profile):
+        """Encode every sentence once with unit-length embeddings
+        
+        Returns (sentences, embeddings) shared by the coherence and embedding analyzers.
+        """
+        return self.embed_sentences_many([profile])[0]
+    
+    def embed_sentences_many(self, profiles, reuse=None):
+        """Sentence embeddings for several documents from a single encode call
+        
+        Sentences found in the sentence cache are not encoded again; when `reuse`
+        is a list, (sentences reused, sentences) is appended to it per document.
+        If encoding fails every document gets None embeddings and a None reuse entry.
+        """
+        reuse_start = len(reuse) if reuse is not None else 0
+        try:
+            sentences = [sentence for profile in profiles for sentence in profile.sentences]
+            cached = [None] * len(sentences)
+            if self.sentence_cache is not None:
+                keys = [self.sentence_cache.embedding_key(sentence) for sentence in sentences]
+                cached = [self.sentence_cache.get(key) for key in keys]
+            missing = [i for i, embedding in enumerate(cached) if embedding is None]
+            
+            if missing:
+                with torch.inference_mode():
+                    encoded = self.sentence_model.encode([sentences[i] for i in missing], normalize_embeddings=True,
+                                                         convert_to_numpy=True)
+            if len(missing) == len(sentences):
+                embeddings = encoded if sentences else None
+            else:
+                dimension = next(embedding for embedding in cached if embedding is not None).shape[0]
+                embeddings = np.empty((len(sentences), dimension), dtype=np.float32)
+                for index, embedding in enumerate(cached):
+                    if embedding is not None:
+                        embeddings[index] = embedding
+                if missing:
+                    embeddings[missing] = encoded
+            if self.sentence_cache is not None:
+                for row, index in enumerate(missing):
+                    self.sentence_cache.put(keys[index], encoded[row].copy())
+            encoded_mask = np.zeros(len(sentences), dtype=bool)
+            encoded_mask[missing] = True
+            
+            per_document = []
+            offset = 0
+            for profile in profiles:
+                count = len(profile.sentences)
+                if count:
+                    per_document.append((profile.sentences, embeddings[offset:offset + count]))
+                else:
+                    per_document.append((profile.sentences, np.zeros((0, 0), dtype=np.float32)))
+                if reuse is not None:
+                    reused = count - int(encoded_mask[offset:offset + count].sum())
+                    reuse.append((reused, count) if self.sentence_cache is not None else None)
+                offset += count
+            return per_document
+            
+        except Exception as e:
+            log(LOG_ERROR, f"❌ Sentence embedding failed: {e}")
+            if reuse is not None:
+                # One entry per document, so callers zipping over it still reach every document
+                del reuse[reuse_start:]
+                reuse.extend([None] * len(profiles))
+            return [None] * len(profiles)
+    
+    def analyze_semantic_coherence(self, profile, sentence_embeddings=None):
         """Analyze semantic coherence using sentence embeddings"""
         if not self.neural_ready:
             return 50
         
         try:
-            sentences = re.split(r'[.!?]+', text)
-            sentences = [s.strip() for s in sentences if s.strip() and len(s) > 10]
+            sentences, embeddings = sentence_embeddings or self.embed_sentences(profile)
+            keep = [i for i, s in enumerate(sentences) if len(s) > 10]
             
-            if len(sentences) < 2:
+            if len(keep) < 2:
                 return 50
             
-            # Get sentence embeddings
-            embeddings = self.sentence_model.encode(sentences)
-            
-            # Calculate average cosine similarity between adjacent sentences
-            similarities = []
-            for i in range(len(embeddings) - 1):
-                sim = np.dot(embeddings[i], embeddings[i+1]) / (
-                    np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[i+1])
-                )
-                similarities.append(sim)
+            # Embeddings are unit length, so adjacent cosines are row-wise dot products
+            embeddings = embeddings[keep]
+            similarities = np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
             
             avg_similarity = np.mean(similarities)
-            print(f"🔗 Average semantic similarity: {avg_similarity:.3f}", file=sys.stderr)
+            log(LOG_DEBUG, "🔗 Average semantic similarity: %.3f", avg_similarity)
             
             # AI text often has unnaturally high semantic coherence
             if avg_similarity > 0.85:
@@ -341,24 +1799,31 @@ class HybridNeuralAIDetector:
                 return 18  # Low coherence - very likely human
                 
         except Exception as e:
-            print(f"❌ Semantic coherence analysis failed: {e}", file=sys.stderr)
+            log(LOG_ERROR, f"❌ Semantic coherence analysis failed: {e}")
             return 50
     
-    def analyze_neural_embeddings(self, text):
+    def analyze_neural_embeddings(self, profile, sentence_embeddings=None):
         """Advanced neural embedding analysis with enhanced heuristics"""
         if not self.neural_ready:
             return 50
         
         try:
-            # Get text embedding
-            embedding = self.sentence_model.encode([text])[0]
+            sentences, embeddings = sentence_embeddings or self.embed_sentences(profile)
+            if not sentences:
+                return 50
+            
+            # Document vector: word-weighted mean of the sentence vectors, renormalized
+            # to unit length like a full-document encode
+            weights = np.maximum(np.array(profile.sentence_word_counts, dtype=np.float32), 1)
+            embedding = weights @ embeddings / weights.sum()
+            embedding = embedding / max(np.linalg.norm(embedding), 1e-12)
             
             # Analyze embedding characteristics
             embedding_norm = np.linalg.norm(embedding)
             embedding_mean = np.mean(embedding)
             embedding_std = np.std(embedding)
             
-            print(f"🧮 Embedding stats - norm: {embedding_norm:.3f}, mean: {embedding_mean:.3f}, std: {embedding_std:.3f}", file=sys.stderr)
+            log(LOG_DEBUG, "🧮 Embedding stats - norm: %.3f, mean: %.3f, std: %.3f", embedding_norm, embedding_mean, embedding_std)
             
             # Enhanced heuristics based on AI vs human embedding patterns
             score = 50  # Start neutral
@@ -382,13 +1847,21 @@ class HybridNeuralAIDetector:
             return max(0, min(100, score))
             
         except Exception as e:
-            print(f"❌ Neural embedding analysis failed: {e}", file=sys.stderr)
+            log(LOG_ERROR, f"❌ Neural embedding analysis failed: {e}")
             return 50
     
     # PHASE 4: ENHANCED ENSEMBLE AND CALIBRATION
-    def ensemble_prediction(self, scores):
-        """Enhanced ensemble prediction with optimized weights"""
-        if self.neural_ready:
+    def ensemble_prediction(self, scores, stages=None):
+        """Enhanced ensemble prediction with optimized weights
+        
+        `stages` lists the analyzers that actually ran (default: all of them when the
+        neural models are loaded). Partial neural sets, as produced by the cascade,
+        use the full-ensemble weights of the stages present, renormalized.
+        """
+        if stages is None:
+            stages = ENSEMBLE_STAGES if self.neural_ready else ('statistical', 'writing_style')
+        
+        if any(stage in NEURAL_STAGES for stage in stages):
             # Full neural ensemble with optimized weights
             weights = {
                 'statistical': 0.10,         # Reduced - less reliable alone
@@ -397,6 +1870,9 @@ class HybridNeuralAIDetector:
                 'neural_embedding': 0.10,    # Supporting neural evidence
                 'writing_style': 0.15        # Important style patterns
             }
+            if len(stages) < len(weights):
+                total = sum(weights[stage] for stage in stages)
+                weights = {stage: weights[stage] / total for stage in stages}
         else:
             # Fallback ensemble without neural components
             weights = {
@@ -409,8 +1885,8 @@ class HybridNeuralAIDetector:
         
         weighted_score = sum(scores.get(method, 50) * weight for method, weight in weights.items())
         
-        print(f"📊 Ensemble scores: {scores}", file=sys.stderr)
-        print(f"⚖️ Weighted ensemble score: {weighted_score:.1f}", file=sys.stderr)
+        log(LOG_DEBUG, "📊 Ensemble scores: %s", scores)
+        log(LOG_DEBUG, "⚖️ Weighted ensemble score: %.1f", weighted_score)
         
         # More aggressive sigmoid for clearer decision boundaries
         calibrated = 1 / (1 + math.exp(-(weighted_score - 42) / 8))  # Tighter sigmoid
@@ -418,20 +1894,20 @@ class HybridNeuralAIDetector:
     
     def calibrate_prediction(self, raw_probability, text_length, word_count):
         """Enhanced calibration for different text characteristics"""
-        print(f"🎯 Calibrating: raw={raw_probability:.1f}%, words={word_count}", file=sys.stderr)
+        log(LOG_DEBUG, "🎯 Calibrating: raw=%.1f%%, words=%d", raw_probability, word_count)
         
         if word_count < 30:
             # Very short texts - conservative but not too neutral
             calibrated = raw_probability * 0.75 + 20
-            print(f"📏 Very short text: {calibrated:.1f}%", file=sys.stderr)
+            log(LOG_DEBUG, "📏 Very short text: %.1f%%", calibrated)
         elif word_count < 100:
             # Short texts - mild conservative adjustment
             calibrated = raw_probability * 0.9 + 10
-            print(f"📏 Short text: {calibrated:.1f}%", file=sys.stderr)
+            log(LOG_DEBUG, "📏 Short text: %.1f%%", calibrated)
         elif word_count > 300:
             # Long texts - more confident, better signal
             calibrated = raw_probability * 1.12 - 6
-            print(f"📏 Long text: {calibrated:.1f}%", file=sys.stderr)
+            log(LOG_DEBUG, "📏 Long text: %.1f%%", calibrated)
         else:
             # Medium length - slight confidence boost
             calibrated = raw_probability * 1.05 - 2
@@ -460,25 +1936,66 @@ class HybridNeuralAIDetector:
             return "Low"   # Close to neutral - uncertain
     
     # EXISTING STATISTICAL METHODS (ENHANCED)
-    def extract_statistical_features(self, text):
+    def extract_statistical_features(self, profile):
         """Enhanced statistical feature extraction"""
-        words = self.tokenize_words(text)
-        sentences = self.tokenize_sentences(text)
-        
-        if len(words) < 10:
+        if len(profile.words) < 10:
             return self.get_neutral_features()
         
         features = {}
         
         # Enhanced feature extraction
-        features['ai_phrase_density'] = self.calculate_ai_phrase_density(text, sentences)
-        features['sentence_uniformity'] = self.calculate_sentence_uniformity(sentences)
-        features['vocabulary_complexity'] = self.calculate_vocabulary_complexity(words)
-        features['transition_density'] = self.calculate_transition_density(text, sentences)
-        features['repetition_score'] = self.calculate_repetition_patterns(words)
+        features['ai_phrase_density'] = self.calculate_ai_phrase_density(profile)
+        features['sentence_uniformity'] = self.calculate_sentence_uniformity(profile)
+        features['vocabulary_complexity'] = self.calculate_vocabulary_complexity(profile)
+        features['transition_density'] = self.calculate_transition_density(profile)
+        features['repetition_score'] = self.calculate_repetition_patterns(profile)
         
         return features
     
+    def extract_feature_matrix(self, documents):
+        """Statistical features of many documents as an (N x len(STATISTICAL_FEATURES)) matrix
+        
+        `documents` are texts or TextProfiles. Rows are identical to
+        extract_statistical_features() for each document; the word- and
+        sentence-length statistics are computed for all documents at once over
+        concatenated arrays split at document boundaries.
+        """
+        profiles = [doc if isinstance(doc, TextProfile) else TextProfile(doc) for doc in documents]
+        matrix = np.full((len(profiles), len(STATISTICAL_FEATURES)), 50.0)
+        columns = {name: index for index, name in enumerate(STATISTICAL_FEATURES)}
+        
+        rows = np.array([i for i, profile in enumerate(profiles) if len(profile.words) >= 10], dtype=np.int64)
+        if not len(rows):
+            return matrix
+        scored = [profiles[i] for i in rows]
+        
+        # Phrase densities (the phrase matcher is a regex, so still one call per document)
+        sentence_counts = np.array([max(len(p.sentences), 1) for p in scored], dtype=np.float64)
+        ai_phrases = np.array([self.phrase_matcher.total(self.count_phrases(p), 'ai_phrases') for p in scored])
+        transitions = np.array([self.phrase_matcher.total(self.count_phrases(p), 'transitions') for p in scored])
+        matrix[rows, columns['ai_phrase_density']] = np.minimum(100, ai_phrases / sentence_counts * 180)
+        matrix[rows, columns['transition_density']] = np.minimum(100, transitions / sentence_counts * 140)
+        
+        # Vocabulary complexity: word-length means over the concatenated word lengths
+        word_counts = np.array([len(p.words) for p in scored], dtype=np.int64)
+        avg_word_lengths, _ = segment_mean_std(np.concatenate([p.word_lengths for p in scored]), word_counts)
+        lexical_diversity = np.array([p.vocabulary_size for p in scored]) / word_counts
+        complexity = (avg_word_lengths / 6.5) * 50 + (lexical_diversity - 0.42) * -45 + 52
+        matrix[rows, columns['vocabulary_complexity']] = np.clip(complexity, 0, 100)
+        
+        # Sentence uniformity: coefficient of variation of sentence lengths (needs 2+ sentences)
+        multi = np.array([len(p.sentences) >= 2 for p in scored])
+        if multi.any():
+            lengths = [p.sentence_word_counts for p, keep in zip(scored, multi) if keep]
+            means, stds = segment_mean_std(np.concatenate(lengths), [len(l) for l in lengths])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                uniformity = np.clip((0.65 - stds / means) * 120, 0, 100)
+            matrix[rows[multi], columns['sentence_uniformity']] = np.where(means == 0, 50, uniformity)
+        
+        # Repetition: n-gram counting stays per document (keys would overflow across a batch)
+        matrix[rows, columns['repetition_score']] = [self.calculate_repetition_patterns(p) for p in scored]
+        return matrix
+    
     def calculate_statistical_probability(self, features):
         """Enhanced statistical probability calculation"""
         # Optimized weights for statistical features
@@ -499,23 +2016,25 @@ class HybridNeuralAIDetector:
         normalized_score = 1 / (1 + math.exp(-(weighted_score - 52) / 9))
         return normalized_score * 100
     
-    def calculate_ai_phrase_density(self, text, sentences):
+    def count_phrases(self, profile):
+        """Per-phrase hits of the AI phrase and transition lists, computed once per profile"""
+        if profile.phrase_counts is None:
+            profile.phrase_counts = self.phrase_matcher.count(profile.lower)
+        return profile.phrase_counts
+    
+    def calculate_ai_phrase_density(self, profile):
         """Enhanced AI phrase density calculation"""
-        text_lower = text.lower()
-        phrase_count = 0
-        
-        for phrase in self.ai_phrases:
-            phrase_count += len(re.findall(r'\b' + re.escape(phrase) + r'\b', text_lower))
+        phrase_count = self.phrase_matcher.total(self.count_phrases(profile), 'ai_phrases')
         
-        density = phrase_count / max(len(sentences), 1)
+        density = phrase_count / max(len(profile.sentences), 1)
         return min(100, density * 180)  # Slightly adjusted multiplier
     
-    def calculate_sentence_uniformity(self, sentences):
+    def calculate_sentence_uniformity(self, profile):
         """Enhanced sentence uniformity analysis"""
-        if len(sentences) < 2:
+        if len(profile.sentences) < 2:
             return 50
         
-        lengths = [len(s.split()) for s in sentences if s.strip()]
+        lengths = profile.sentence_word_counts
         if not lengths:
             return 50
         
@@ -530,14 +2049,15 @@ class HybridNeuralAIDetector:
         uniformity_score = max(0, min(100, (0.65 - cv) * 120))
         return uniformity_score
     
-    def calculate_vocabulary_complexity(self, words):
+    def calculate_vocabulary_complexity(self, profile):
         """Enhanced vocabulary complexity analysis"""
+        words = profile.words
         if len(words) < 10:
             return 50
         
-        unique_words = len(set(words))
+        unique_words = profile.vocabulary_size
         lexical_diversity = unique_words / len(words)
-        avg_word_length = np.mean([len(word) for word in words])
+        avg_word_length = np.mean(profile.word_lengths)
         
         # Enhanced complexity scoring
         complexity_score = (avg_word_length / 6.5) * 50
@@ -545,54 +2065,38 @@ class HybridNeuralAIDetector:
         
         return max(0, min(100, complexity_score + diversity_factor + 52))
     
-    def calculate_transition_density(self, text, sentences):
+    def calculate_transition_density(self, profile):
         """Enhanced transition density calculation"""
-        transition_patterns = [
-            r'\b(however|nevertheless|furthermore|moreover|therefore|thus|hence)\b',
-            r'\b(in addition|in conclusion|as a result|on the other hand)\b',
-            r'\b(similarly|likewise|consequently|meanwhile|thereafter|notably)\b',
-            r'\b(specifically|particularly|essentially|ultimately|indeed)\b'
-        ]
+        transition_count = self.phrase_matcher.total(self.count_phrases(profile), 'transitions')
         
-        transition_count = 0
-        for pattern in transition_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            transition_count += len(matches)
-        
-        density = transition_count / max(len(sentences), 1)
+        density = transition_count / max(len(profile.sentences), 1)
         return min(100, density * 140)  # Adjusted multiplier
     
-    def calculate_repetition_patterns(self, words):
+    def calculate_repetition_patterns(self, profile):
         """Enhanced repetition pattern analysis"""
+        words = profile.words
         if len(words) < 10:
             return 0
         
-        # Analyze both trigrams and bigrams
-        trigrams = [' '.join(words[i:i+3]) for i in range(len(words) - 2)]
-        bigrams = [' '.join(words[i:i+2]) for i in range(len(words) - 1)]
+        # Analyze both trigrams and bigrams, counted over integer n-gram keys
+        trigram_total = len(words) - 2
+        bigram_total = len(words) - 1
         
-        if not trigrams:
-            return 0
+        repeated_trigrams = count_repeated_ngrams(profile.token_ids, profile.vocabulary_size, 3, 1)
+        repeated_bigrams = count_repeated_ngrams(profile.token_ids, profile.vocabulary_size, 2, 2)
         
-        # Count repetitions in both n-grams
-        trigram_counts = Counter(trigrams)
-        bigram_counts = Counter(bigrams)
-        
-        repeated_trigrams = sum(1 for count in trigram_counts.values() if count > 1)
-        repeated_bigrams = sum(1 for count in bigram_counts.values() if count > 2)
-        
-        trigram_score = (repeated_trigrams / len(trigrams)) * 100
-        bigram_score = (repeated_bigrams / len(bigrams)) * 50
+        trigram_score = (repeated_trigrams / trigram_total) * 100
+        bigram_score = (repeated_bigrams / bigram_total) * 50
         
         return (trigram_score + bigram_score) / 2
     
     def tokenize_words(self, text):
         """Enhanced word tokenization"""
-        return re.findall(r'\b\w+\b', text.lower())
+        return WORD_PATTERN.findall(text.lower())
     
     def tokenize_sentences(self, text):
         """Enhanced sentence tokenization"""
-        sentences = re.split(r'[.!?]+', text)
+        sentences = SENTENCE_BOUNDARY_PATTERN.split(text)
         return [s.strip() for s in sentences if s.strip()]
     
     def get_neutral_features(self):
@@ -621,37 +2125,536 @@ class HybridNeuralAIDetector:
             }
         }
 
+def validate_request(data):
+    """Check a request payload and return the text to analyze"""
+    if not isinstance(data, dict):
+        raise ValueError('Request must be a JSON object')
+    
+    text = data.get('text', '')
+    if not text or not isinstance(text, str):
+        raise ValueError('Invalid or missing text')
+    
+    mode = data.get('mode')
+    if mode is not None and mode not in DETECTION_MODES:
+        raise ValueError(f"Invalid mode: expected one of {', '.join(DETECTION_MODES)}")
+    
+    return text
+
+def process_request(detector, data):
+    """Validate a single request payload and run detection on it"""
+    text = validate_request(data)
+    
+    log(LOG_DEBUG, "🎯 Processing text with %d characters...", len(text))
+    result = detector.detect(text, data.get('mode'))
+    
+    # Generate performance summary
+    if VERBOSITY >= LOG_DEBUG:
+        summary = detector.get_detection_summary(result)
+        log(LOG_DEBUG, "📊 Detection summary: %s", summary['accuracy_indicators'])
+    
+    return result
+
+def stream_request(detector, data, request_id=None):
+    """Validate a request and yield its section messages and final result, each tagged with the id"""
+    try:
+        text = validate_request(data)
+        log(LOG_DEBUG, "🌊 Streaming text with %d characters...", len(text))
+        for message in detector.detect_stream(text, data.get('mode')):
+            yield {'id': request_id, **message}
+    except Exception as e:
+        log(LOG_ERROR, f"💥 Request {request_id} failed: {str(e)}")
+        yield {'id': request_id, 'type': 'error', 'error': f'Processing failed: {str(e)}'}
+
+def parse_input(input_data):
+    """Parse stdin as one request object, a JSON array of requests, or JSONL
+    
+    Returns (requests, form) where form is 'single', 'array' or 'jsonl'. Batch
+    items may be plain strings or request objects.
+    """
+    try:
+        data = json.loads(input_data)
+    except json.JSONDecodeError:
+        lines = [line for line in input_data.splitlines() if line.strip()]
+        if len(lines) < 2:
+            raise
+        return [json.loads(line) for line in lines], 'jsonl'
+    
+    if isinstance(data, list):
+        return data, 'array'
+    return [data], 'single'
+
+def process_batch(detector, items):
+    """Run detect_many over batch items, keeping per-item errors and ids in input order
+    
+    Items without a mode run in the detector's mode (--mode).
+    """
+    outputs = [None] * len(items)
+    groups = {}  # mode -> (texts, slots)
+    
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'text': item}
+        try:
+            text = validate_request(item)
+        except ValueError as e:
+            outputs[index] = {'error': str(e)}
+            continue
+        texts, slots = groups.setdefault(item.get('mode') or detector.mode, ([], []))
+        texts.append(text)
+        slots.append(index)
+    
+    for mode, (texts, slots) in groups.items():
+        log(LOG_DEBUG, "🎯 Processing batch of %d documents...", len(texts))
+        for index, result in zip(slots, detector.detect_many(texts, mode)):
+            outputs[index] = result
+    
+    for item, output in zip(items, outputs):
+        if isinstance(item, dict) and 'id' in item:
+            output['id'] = item['id']
+    return outputs
+
+def export_models(directory, inference_profile):
+    """Save the checkpoints an inference profile needs into a local model store (safetensors)"""
+    if not load_neural_libraries():
+        raise RuntimeError('Neural libraries not available')
+    
+    profile = INFERENCE_PROFILES[inference_profile]
+    sentence_path = os.path.join(directory, profile['sentence'])
+    SentenceTransformer(profile['sentence']).save(sentence_path)
+    
+    gpt2_path = os.path.join(directory, profile['gpt2'])
+    GPT2LMHeadModel.from_pretrained(profile['gpt2']).save_pretrained(gpt2_path)
+    GPT2TokenizerFast.from_pretrained(profile['gpt2']).save_pretrained(gpt2_path)
+    return [sentence_path, gpt2_path]
+
+def write_message(message):
+    """Write one JSON message per line to stdout and flush immediately"""
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+def build_detector(args, mode=None):
+    """Construct the detector from command line options"""
+    return HybridNeuralAIDetector(
+        perplexity_batch_size=args.batch_size,
+        chunk_tokens=args.chunk_tokens,
+        chunk_stride=args.chunk_stride,
+        use_cache=False if args.no_cache else None,
+        mode=mode or args.mode,
+        cascade_band=args.cascade_band,
+        inference_profile=args.inference_profile,
+        section_words=args.section_words,
+        trace_memory=args.trace_memory or None,
+        trace_file=args.trace_file,
+        model_dir=args.model_dir,
+        sample_threshold=args.sample_threshold,
+        sample_sections=args.sample_sections,
+        sentence_cache_bytes=args.sentence_cache_bytes
+    )
+
+def startup_time():
+    """Milliseconds since this module started importing"""
+    return int((time.time() - PROCESS_START) * 1000)
+
+def run_worker(args):
+    """Persistent worker: load models once, then answer newline-delimited JSON requests
+    
+    Each request line is a JSON object with an optional `id` and a `type` of
+    `detect` (default), `stream`, `health` or `shutdown`. Every reply is a single
+    JSON line echoing the request `id` so callers can match replies to requests;
+    a `stream` request gets one `section` line per section before its `result`.
+    """
+    started = time.time()
+    detector = build_detector(args)
+    load_time = int((time.time() - started) * 1000)
+    handled = 0
+    
+    write_message({
+        'type': 'ready',
+        'pid': os.getpid(),
+        'mode': detector.mode,
+        'inference_profile': detector.inference_profile,
+        'neural_ready': detector.neural_ready,
+        'load_time': load_time,
+        'model_load': detector.model_load,
+        'startup_time': startup_time()
+    })
+    
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break  # EOF - caller closed stdin
+        
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            write_message({'id': None, 'type': 'error', 'error': f'Invalid JSON: {e}'})
+            continue
+        
+        request_id = data.get('id') if isinstance(data, dict) else None
+        request_type = data.get('type', 'detect') if isinstance(data, dict) else 'detect'
+        
+        if request_type == 'health':
+            write_message({
+                'id': request_id,
+                'type': 'health',
+                'status': 'ok',
+                'pid': os.getpid(),
+                'neural_ready': detector.neural_ready,
+                'requests_handled': handled,
+                'cache': detector.result_cache.stats() if detector.result_cache else None,
+                'sentence_cache': detector.sentence_cache.stats() if detector.sentence_cache else None,
+                'uptime': int((time.time() - started) * 1000)
+            })
+            continue
+        
+        if request_type == 'shutdown':
+            break
+        
+        if request_type == 'stream':
+            for message in stream_request(detector, data, request_id):
+                write_message(message)
+        else:
+            write_message(detect_reply(detector, data, request_id))
+        handled += 1
+    
+    log(LOG_INFO, f"👋 Worker shutting down after {handled} requests")
+    write_message({'type': 'shutdown', 'requests_handled': handled})
+
+def detect_reply(detector, data, request_id):
+    """Run one detect request and wrap the outcome as a result or error reply"""
+    try:
+        result = process_request(detector, data)
+        return {'id': request_id, 'type': 'result', 'result': result}
+    except Exception as e:
+        log(LOG_ERROR, f"💥 Request {request_id} failed: {str(e)}")
+        return {'id': request_id, 'type': 'error', 'error': f'Processing failed: {str(e)}'}
+
+def pool_size(workers=None, threads=None):
+    """Resolve (workers, threads per worker) from options, env and the CPU count"""
+    threads = max(1, threads or POOL_THREADS)
+    workers = workers or POOL_WORKERS or max(1, (os.cpu_count() or 1) // threads)
+    return workers, threads
+
+def spawn_pool_worker(detector, threads, siblings=()):
+    """Fork a worker that shares the parent's loaded models; returns (pid, parent socket)
+    
+    `siblings` are the parent's sockets to the other workers; the child closes its
+    copies so each worker still sees EOF when the parent closes its socket.
+    """
+    parent_socket, child_socket = socket.socketpair()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        child_socket.close()
+        return pid, parent_socket
+    
+    # Child: never touch the parent's stdin/stdout, only the socket
+    parent_socket.close()
+    for sibling in siblings:
+        sibling.close()
+    exit_code = 0
+    try:
+        run_pool_worker(detector, child_socket, threads)
+    except BaseException as e:
+        log(LOG_ERROR, f"💥 Pool worker {os.getpid()} crashed: {str(e)}")
+        exit_code = 1
+    finally:
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+def run_pool_worker(detector, connection, threads):
+    """Pool worker loop: one JSON request line in, one JSON reply line out"""
+    if torch is not None:
+        torch.set_num_threads(threads)
+    reader = connection.makefile('r', encoding='utf-8')
+    writer = connection.makefile('w', encoding='utf-8')
+    for line in reader:
+        data = json.loads(line)
+        if data.get('type') == 'stream':
+            replies = stream_request(detector, data, data.get('id'))
+        else:
+            replies = [detect_reply(detector, data, data.get('id'))]
+        for reply in replies:
+            writer.write(json.dumps(reply) + '\n')
+            writer.flush()
+
+def run_pool(args):
+    """Pool mode: the --worker NDJSON protocol served by several forked worker processes
+    
+    The parent loads the models once, then forks the workers so the weights are
+    shared copy-on-write, and hands each detect request to the next idle worker.
+    Replies are written as workers finish, so they may come back out of order;
+    match them by `id`. A worker that dies is replaced by a fresh fork.
+    """
+    started = time.time()
+    detector = build_detector(args)
+    load_time = int((time.time() - started) * 1000)
+    workers, threads = pool_size(args.pool_workers, args.threads_per_worker)
+    
+    # Move everything loaded so far out of the collector's reach so that garbage
+    # collection in the workers does not write to (and un-share) those pages
+    import gc
+    gc.collect()
+    gc.freeze()
+    
+    pool = {}  # parent socket -> pid
+    for _ in range(workers):
+        pid, connection = spawn_pool_worker(detector, threads, list(pool))
+        pool[connection] = pid
+    log(LOG_INFO, f"👷 Pool started: {workers} workers x {threads} threads")
+    
+    # poll/select rather than epoll: epoll refuses stdin when it is redirected from a regular file
+    selector = selectors.PollSelector() if hasattr(selectors, 'PollSelector') else selectors.SelectSelector()
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ)
+    for connection in pool:
+        selector.register(connection, selectors.EVENT_READ)
+    
+    buffers = {}  # file descriptor -> partial line bytes
+    idle = deque(pool)
+    in_flight = {}  # parent socket -> request id
+    pending = deque()
+    handled = 0
+    accepting = True
+    
+    write_message({
+        'type': 'ready',
+        'pid': os.getpid(),
+        'mode': detector.mode,
+        'inference_profile': detector.inference_profile,
+        'neural_ready': detector.neural_ready,
+        'workers': workers,
+        'threads_per_worker': threads,
+        'load_time': load_time,
+        'model_load': detector.model_load,
+        'startup_time': startup_time()
+    })
+    
+    def dispatch():
+        while pending and idle:
+            connection = idle.popleft()
+            data = pending.popleft()
+            in_flight[connection] = data.get('id')
+            connection.sendall((json.dumps(data) + '\n').encode('utf-8'))
+    
+    def read_lines(fd, chunk):
+        lines = (buffers.pop(fd, b'') + chunk).split(b'\n')
+        if lines[-1]:
+            buffers[fd] = lines[-1]
+        return [line for line in lines[:-1] if line.strip()]
+    
+    def handle_request(line):
+        nonlocal accepting
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            write_message({'id': None, 'type': 'error', 'error': f'Invalid JSON: {e}'})
+            return
+        if not isinstance(data, dict):
+            write_message({'id': None, 'type': 'error', 'error': 'Request must be a JSON object'})
+            return
+        
+        request_type = data.get('type', 'detect')
+        if request_type == 'health':
+            write_message({
+                'id': data.get('id'),
+                'type': 'health',
+                'status': 'ok',
+                'pid': os.getpid(),
+                'neural_ready': detector.neural_ready,
+                'workers': len(pool),
+                'busy': len(in_flight),
+                'queued': len(pending),
+                'requests_handled': handled,
+                'uptime': int((time.time() - started) * 1000)
+            })
+        elif request_type == 'shutdown':
+            accepting = False
+        else:
+            pending.append(data)
+    
+    def replace_worker(connection):
+        selector.unregister(connection)
+        buffers.pop(connection.fileno(), None)
+        connection.close()
+        os.waitpid(pool.pop(connection), 0)
+        if connection in idle:
+            idle.remove(connection)
+        if connection in in_flight:
+            request_id = in_flight.pop(connection)
+            write_message({'id': request_id, 'type': 'error', 'error': 'Processing failed: worker exited'})
+        
+        pid, fresh = spawn_pool_worker(detector, threads, list(pool))
+        pool[fresh] = pid
+        selector.register(fresh, selectors.EVENT_READ)
+        idle.append(fresh)
+        log(LOG_INFO, f"♻️ Replaced pool worker with pid {pid}")
+    
+    while accepting or pending or in_flight:
+        for key, _ in selector.select():
+            if key.fileobj == sys.stdin.fileno():
+                chunk = os.read(key.fileobj, 65536)
+                if not chunk:
+                    lines = [buffers.pop(key.fileobj, b'')]  # a last request without a trailing newline
+                else:
+                    lines = read_lines(key.fileobj, chunk)
+                for line in lines:
+                    if line.strip() and accepting:
+                        handle_request(line)
+                if not chunk:
+                    accepting = False  # EOF - caller closed stdin
+                if not accepting:
+                    selector.unregister(key.fileobj)
+                continue
+            
+            connection = key.fileobj
+            chunk = connection.recv(65536)
+            if not chunk:
+                replace_worker(connection)
+                continue
+            for line in read_lines(connection.fileno(), chunk):
+                sys.stdout.write(line.decode('utf-8') + '\n')
+                if json.loads(line).get('type') == 'section':
+                    continue  # the worker is still streaming this request
+                in_flight.pop(connection, None)
+                idle.append(connection)
+                handled += 1
+            sys.stdout.flush()
+        dispatch()
+    
+    for connection, pid in pool.items():
+        connection.close()
+        os.waitpid(pid, 0)
+    
+    log(LOG_INFO, f"👋 Pool shutting down after {handled} requests")
+    write_message({'type': 'shutdown', 'requests_handled': handled})
+
+def parse_args(argv=None):
+    """Command line options for the detector entry point"""
+    parser = argparse.ArgumentParser(description='Hybrid neural AI text detector')
+    parser.add_argument('--worker', action='store_true',
+                        help='stay alive and answer newline-delimited JSON requests on stdin')
+    parser.add_argument('--verbosity', type=int, choices=(LOG_ERROR, LOG_INFO, LOG_DEBUG), default=None,
+                        help=f'stderr logging: 0 errors only, 1 lifecycle, 2 every stage (default: {VERBOSITY})')
+    parser.add_argument('--quiet', action='store_true', help='same as --verbosity 0')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='add per-stage tracemalloc peaks to breakdown.timings')
+    parser.add_argument('--trace-file', default=None,
+                        help='append one JSON line of stage timings per analyzed document to this file')
+    parser.add_argument('--stream', action='store_true',
+                        help='score one request section by section, writing NDJSON partial results')
+    parser.add_argument('--section-words', type=int, default=None,
+                        help=f'minimum words per streamed section (default: {STREAM_SECTION_WORDS})')
+    parser.add_argument('--sample-threshold', type=int, default=None,
+                        help='score texts longer than this many characters from a stratified sample of sections '
+                             f'(default: {SAMPLE_THRESHOLD}, 0 disables sampling)')
+    parser.add_argument('--sample-sections', type=int, default=None,
+                        help=f'sections sampled from a long text, one per stratum (default: {SAMPLE_SECTIONS})')
+    parser.add_argument('--pool', action='store_true',
+                        help='like --worker, but serve requests from a pool of forked worker processes')
+    parser.add_argument('--pool-workers', type=int, default=None,
+                        help='pool worker processes (default: cpu count / threads per worker)')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help=f'torch threads in each pool worker (default: {POOL_THREADS})')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f'chunks per GPT-2 forward pass (default: {PERPLEXITY_BATCH_SIZE})')
+    parser.add_argument('--chunk-tokens', type=int, default=None,
+                        help=f'GPT-2 window size in tokens (default: {CHUNK_TOKENS})')
+    parser.add_argument('--chunk-stride', type=int, default=None,
+                        help='tokens between window starts; smaller than --chunk-tokens for overlap')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='bypass the result cache under cache/ai-detection')
+    parser.add_argument('--sentence-cache-bytes', type=int, default=None,
+                        help='memory for cached sentence embeddings and GPT-2 token losses, 0 disables '
+                             f'(default: {SENTENCE_CACHE_BYTES})')
+    parser.add_argument('--mode', choices=DETECTION_MODES, default=DEFAULT_MODE,
+                        help='default mode for requests without one; fast never imports torch')
+    parser.add_argument('--model-dir', default=None,
+                        help='local model store (one directory per checkpoint); loads offline with mmapped weights')
+    parser.add_argument('--export-models', metavar='DIR', default=None,
+                        help='save the models of --inference-profile into DIR for use with --model-dir, then exit')
+    parser.add_argument('--inference-profile', choices=list(INFERENCE_PROFILES), default=None,
+                        help=f'neural model profile for CPU inference (default: {DEFAULT_INFERENCE_PROFILE})')
+    parser.add_argument('--cascade-band', type=float, default=None,
+                        help=f'cascade escalates while |probability - 50| <= band (default: {CASCADE_BAND})')
+    return parser.parse_args(argv)
+
 def main():
     """Main execution function with enhanced error handling"""
+    global VERBOSITY
+    args = parse_args()
+    if args.quiet:
+        VERBOSITY = LOG_ERROR
+    elif args.verbosity is not None:
+        VERBOSITY = args.verbosity
+    log(LOG_INFO, "🐍 Advanced Hybrid Neural AI Detector Starting...")
+    
+    if args.export_models:
+        paths = export_models(args.export_models, args.inference_profile or DEFAULT_INFERENCE_PROFILE)
+        print(json.dumps({'saved': paths}))
+        return
+    
+    if args.pool:
+        run_pool(args)
+        return
+    
+    if args.worker:
+        run_worker(args)
+        return
+    
     try:
-        print("📖 Reading input...", file=sys.stderr)
+        log(LOG_INFO, "📖 Reading input...")
         input_data = sys.stdin.read()
         
         if not input_data.strip():
             print(json.dumps({'error': 'No input provided'}))
             sys.exit(1)
         
-        data = json.loads(input_data)
-        text = data.get('text', '')
+        requests, form = parse_input(input_data)
         
-        if not text or not isinstance(text, str):
-            print(json.dumps({'error': 'Invalid or missing text'}))
-            sys.exit(1)
+        if form != 'single':
+            # Only load the neural models if some item actually needs them
+            modes = {item.get('mode') or args.mode for item in requests if isinstance(item, dict)}
+            if any(isinstance(item, str) for item in requests):
+                modes.add(args.mode)
+            # Items without a mode use --mode; the detector loads models itself if a fast default meets a neural item
+            detector = build_detector(args, 'fast' if modes == {'fast'} else args.mode)
+            outputs = process_batch(detector, requests)
+            
+            log(LOG_INFO, "📤 Sending results...")
+            if form == 'array':
+                print(json.dumps(outputs))
+            else:
+                for output in outputs:
+                    print(json.dumps(output))
+            return
         
-        print(f"🎯 Processing text with {len(text)} characters...", file=sys.stderr)
+        data = requests[0]
+        try:
+            validate_request(data)
+        except ValueError as e:
+            print(json.dumps({'error': str(e)}))
+            sys.exit(1)
         
-        detector = HybridNeuralAIDetector()
-        result = detector.detect(text)
+        detector = build_detector(args, data.get('mode'))
+        if args.stream:
+            for message in stream_request(detector, data, data.get('id')):
+                write_message(message)
+            return
         
-        # Generate performance summary
-        summary = detector.get_detection_summary(result)
-        print(f"📊 Detection summary: {summary['accuracy_indicators']}", file=sys.stderr)
+        result = process_request(detector, data)
+        result['startup_time'] = startup_time()
+        result['model_load'] = detector.model_load
         
-        print("📤 Sending result...", file=sys.stderr)
+        log(LOG_INFO, "📤 Sending result...")
         print(json.dumps(result))
         
     except Exception as e:
-        print(f"💥 Critical error: {str(e)}", file=sys.stderr)
+        log(LOG_ERROR, f"💥 Critical error: {str(e)}")
         print(json.dumps({'error': f'Processing failed: {str(e)}'}))
         sys.exit(1)
 
@@ -0,0 +1,158 @@
+"""Offline benchmark: latency, throughput, memory and accuracy of the detector per mode
+
+Every mode runs in its own subprocess so model load time and peak RSS are
+measured per mode. Documents are bucketed by word count the same way
+calibrate_prediction does:
+
+    python ai_detector_benchmark.py --modes full,fast > benchmark.json
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+from ai_detector import HybridNeuralAIDetector, TextProfile
+from ai_detector_eval import TRAINING_CSV, load_examples, accuracy, roc_auc, percentile, stage_total
+
+STAGES = ('tokenize', 'statistical', 'style', 'perplexity', 'coherence', 'embedding', 'ensemble', 'total')
+
+# Upper word-count bound of each bucket, matching the calibrate_prediction branches
+BUCKETS = (('<30', 30), ('30-99', 100), ('100-300', 301), ('>300', None))
+
+def bucket_for(word_count):
+    """Name of the word-count bucket a document falls into"""
+    for name, limit in BUCKETS:
+        if limit is None or word_count < limit:
+            return name
+
+def run_mode(mode, csv_path, limit):
+    """Benchmark one mode; called inside the per-mode subprocess
+    
+    All documents go through one detect_many call, so neural stages run in
+    shared cross-document batches; per-document stage latencies are the
+    detector's own breakdown.timings, where a batched stage is split evenly
+    among the documents in the batch.
+    """
+    started = time.perf_counter()
+    detector = HybridNeuralAIDetector(use_cache=False, sentence_cache_bytes=0, mode=mode)
+    load_ms = (time.perf_counter() - started) * 1000
+    mode, neural = detector.resolve_mode(mode)
+    
+    texts = [example['text'] for example in load_examples(csv_path, limit)]
+    if texts:
+        detector.detect_many(texts[:1], mode)  # warm-up, not measured
+    
+    started = time.perf_counter()
+    results = detector.detect_many(texts, mode)
+    batch_seconds = time.perf_counter() - started
+    
+    documents = []
+    for text, result in zip(texts, results):
+        timings = dict(result['breakdown']['timings'])
+        timings.pop('memory_peak_kb', None)
+        timings['total'] = stage_total(timings)
+        documents.append({
+            'timings': timings,
+            'probability': result['probability'],
+            'word_count': len(TextProfile(text).words)
+        })
+    
+    return {
+        'mode': mode,
+        'neural': neural,
+        'load_ms': round(load_ms, 1),
+        'batch_seconds': batch_seconds,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'documents': documents
+    }
+
+def spawn_mode(mode, args):
+    """Run one mode in a fresh interpreter and return its raw measurements"""
+    command = [sys.executable, os.path.abspath(__file__), '--run-mode', mode, '--csv', args.csv]
+    if args.limit:
+        command += ['--limit', str(args.limit)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {'mode': mode, 'error': lines[-1] if lines else 'Benchmark run failed'}
+    return json.loads(completed.stdout)
+
+def latency_summary(values):
+    """Percentiles and mean of a list of millisecond timings"""
+    return {
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'mean_ms': round(sum(values) / len(values), 3)
+    }
+
+def summarize(run, labels):
+    """Per-stage and per-bucket latency percentiles, throughput and accuracy for one mode"""
+    if 'error' in run:
+        return run
+    
+    documents = run['documents']
+    probabilities = [document['probability'] for document in documents]
+    stages = {}
+    for stage in STAGES:
+        values = [document['timings'][stage] for document in documents if stage in document['timings']]
+        if values:  # cascade runs the neural stages for some documents only
+            stages[stage] = latency_summary(values)
+    
+    buckets = {}
+    for name, _ in BUCKETS:
+        indexes = [i for i, document in enumerate(documents) if bucket_for(document['word_count']) == name]
+        if not indexes:
+            continue
+        buckets[name] = {
+            'documents': len(indexes),
+            **latency_summary([documents[i]['timings']['total'] for i in indexes]),
+            'accuracy': round(accuracy([labels[i] for i in indexes], [probabilities[i] for i in indexes]), 3)
+        }
+    
+    total_seconds = sum(document['timings']['total'] for document in documents) / 1000
+    auc = roc_auc(labels, probabilities)
+    return {
+        'mode': run['mode'],
+        'neural': run['neural'],
+        'load_ms': run['load_ms'],
+        'peak_rss_mb': run['peak_rss_mb'],
+        'docs_per_second': round(len(documents) / total_seconds, 2) if total_seconds else None,
+        'batch_docs_per_second': round(len(documents) / run['batch_seconds'], 2) if run['batch_seconds'] else None,
+        'accuracy': round(accuracy(labels, probabilities), 3),
+        'auc': round(auc, 3) if auc is not None else None,
+        'stages': stages,
+        'buckets': buckets
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the detector over the labeled training data')
+    parser.add_argument('--csv', default=TRAINING_CSV, help='labeled examples (id,text,label,...)')
+    parser.add_argument('--modes', default='full,fast',
+                        help='comma separated detection modes; full is the neural path, fast the fallback')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N examples')
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.csv, args.limit)))
+        return
+    
+    examples = load_examples(args.csv, args.limit)
+    if not examples:
+        print(json.dumps({'error': f'No labeled examples found in {args.csv}'}))
+        sys.exit(1)
+    labels = [example['label'] for example in examples]
+    
+    report = {
+        'documents': len(examples),
+        'modes': [summarize(spawn_mode(mode, args), labels) for mode in args.modes.split(',') if mode]
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Offline report: latency saved vs agreement lost by the cascade mode at several bands
+
+Scores every labeled example once in full mode, then once in cascade mode per
+band setting, and compares them. Latencies are the detector's own per-stage
+breakdown.timings, so neural stages are measured in their shared batches:
+
+    python ai_detector_cascade_report.py --bands 5,10,15,20,25 > cascade_report.json
+"""
+import sys
+import json
+import argparse
+
+from ai_detector import HybridNeuralAIDetector
+from ai_detector_eval import TRAINING_CSV, load_examples, accuracy, stage_total
+
+def measure(detector, texts, mode):
+    """Probability, stages run and total stage latency of each document in one batched run"""
+    return [
+        {
+            'probability': result['probability'],
+            'stages_run': result['breakdown']['stages_run'],
+            'latency_ms': stage_total(result['breakdown']['timings'])
+        }
+        for result in detector.detect_many(texts, mode)
+    ]
+
+def band_report(detector, texts, labels, full, band):
+    """Cascade outcome for one band, compared with the full pipeline"""
+    detector.cascade_band = band
+    cascade = measure(detector, texts, 'cascade')
+    
+    count = len(cascade)
+    latency = sum(m['latency_ms'] for m in cascade)
+    full_latency = sum(m['latency_ms'] for m in full)
+    probabilities = [m['probability'] for m in cascade]
+    agreements = sum(
+        1 for m, f in zip(cascade, full)
+        if (m['probability'] >= 50) == (f['probability'] >= 50)
+    )
+    return {
+        'band': band,
+        'perplexity_rate': round(sum('perplexity' in m['stages_run'] for m in cascade) / count, 3),
+        'embedding_rate': round(sum('coherence' in m['stages_run'] for m in cascade) / count, 3),
+        'mean_latency_ms': round(latency / count, 2),
+        'latency_saved_pct': round(100 * (1 - latency / full_latency), 1) if full_latency else 0.0,
+        'decision_agreement': round(agreements / count, 3),
+        'mean_abs_diff': round(sum(abs(m['probability'] - f['probability']) for m, f in zip(cascade, full)) / count, 2),
+        'accuracy': round(accuracy(labels, probabilities), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Cascade threshold report over the labeled training data')
+    parser.add_argument('--csv', default=TRAINING_CSV, help='labeled examples (id,text,label,...)')
+    parser.add_argument('--bands', default='5,10,15,20,25,30',
+                        help='comma separated uncertainty bands around 50 to evaluate')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N examples')
+    args = parser.parse_args()
+    
+    detector = HybridNeuralAIDetector(use_cache=False, sentence_cache_bytes=0, mode='full')
+    if not detector.neural_ready:
+        print(json.dumps({'error': 'Neural models unavailable; the cascade has nothing to skip'}))
+        sys.exit(1)
+    
+    examples = load_examples(args.csv, args.limit)
+    if not examples:
+        print(json.dumps({'error': f'No labeled examples found in {args.csv}'}))
+        sys.exit(1)
+    
+    labels = [example['label'] for example in examples]
+    texts = [example['text'] for example in examples]
+    detector.detect_many(texts[:1], 'full')  # warm-up, not measured
+    full = measure(detector, texts, 'full')
+    
+    report = {
+        'documents': len(examples),
+        'full': {
+            'mean_latency_ms': round(sum(m['latency_ms'] for m in full) / len(full), 2),
+            'accuracy': round(accuracy(labels, [m['probability'] for m in full]), 3)
+        },
+        'bands': [band_report(detector, texts, labels, full, float(band)) for band in args.bands.split(',')]
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Shared helpers for the offline ai_detector evaluation scripts"""
+import os
+import csv
+
+TRAINING_CSV = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'training_data', 'training_examples.csv'
+)
+
+# Label column values -> 1 for AI, 0 for human
+LABELS = {'ai': 1, 'ai-generated': 1, 'human': 0}
+
+def load_examples(path=TRAINING_CSV, limit=None):
+    """Labeled texts from the training CSV
+    
+    Rows whose label column is not a known AI/Human label (the CSV has some rows
+    with broken quoting that shift the columns) are skipped.
+    """
+    examples = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            label = LABELS.get((row.get('label') or '').strip().lower())
+            text = (row.get('text') or '').strip()
+            if label is None or not text:
+                continue
+            
+            examples.append({'id': row.get('id'), 'text': text, 'label': label})
+            if limit and len(examples) >= limit:
+                break
+    return examples
+
+def accuracy(labels, probabilities, threshold=50):
+    """Share of documents whose probability falls on the side of their label"""
+    if not labels:
+        return None
+    correct = sum(1 for label, probability in zip(labels, probabilities) if (probability >= threshold) == bool(label))
+    return correct / len(labels)
+
+def roc_auc(labels, scores):
+    """Area under the ROC curve (Mann-Whitney U with tie correction)"""
+    positives = [score for label, score in zip(labels, scores) if label]
+    negatives = [score for label, score in zip(labels, scores) if not label]
+    if not positives or not negatives:
+        return None
+    
+    wins = 0.0
+    for positive in positives:
+        for negative in negatives:
+            if positive > negative:
+                wins += 1
+            elif positive == negative:
+                wins += 0.5
+    return wins / (len(positives) * len(negatives))
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation between closest ranks"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def stage_total(timings):
+    """Total milliseconds of a result's breakdown.timings (memory peaks are not stages)"""
+    return sum(value for stage, value in timings.items() if stage != 'memory_peak_kb')
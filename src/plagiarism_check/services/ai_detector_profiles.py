@@ -0,0 +1,113 @@
+"""Offline report: latency, memory and score drift of each CPU inference profile
+
+Each profile runs in its own subprocess so peak RSS is measured per profile,
+and every profile is compared with the full-precision baseline:
+
+    python ai_detector_profiles.py --profiles full,quantized,distilled > profiles_report.json
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+from ai_detector import HybridNeuralAIDetector, INFERENCE_PROFILES
+from ai_detector_eval import TRAINING_CSV, load_examples, accuracy, roc_auc, percentile
+
+def run_profile(profile, csv_path, limit):
+    """Score every example with one profile; called inside the per-profile subprocess"""
+    started = time.perf_counter()
+    detector = HybridNeuralAIDetector(use_cache=False, sentence_cache_bytes=0, mode='full', inference_profile=profile)
+    load_ms = (time.perf_counter() - started) * 1000
+    if not detector.neural_ready:
+        return {'profile': profile, 'error': 'Neural models unavailable for this profile'}
+    
+    latencies = []
+    probabilities = []
+    for example in load_examples(csv_path, limit):
+        started = time.perf_counter()
+        result = detector.detect(example['text'])
+        latencies.append((time.perf_counter() - started) * 1000)
+        probabilities.append(result['probability'])
+    
+    return {
+        'profile': profile,
+        'load_ms': round(load_ms, 1),
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'latencies': latencies,
+        'probabilities': probabilities
+    }
+
+def spawn_profile(profile, args):
+    """Run one profile in a fresh interpreter and return its raw measurements"""
+    command = [sys.executable, os.path.abspath(__file__), '--run-profile', profile, '--csv', args.csv]
+    if args.limit:
+        command += ['--limit', str(args.limit)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {'profile': profile, 'error': lines[-1] if lines else 'Profile run failed'}
+    return json.loads(completed.stdout)
+
+def summarize(run, labels, baseline):
+    """Latency percentiles, memory, accuracy and drift against the baseline probabilities"""
+    if 'error' in run:
+        return run
+    
+    latencies = run['latencies']
+    probabilities = run['probabilities']
+    auc = roc_auc(labels, probabilities)
+    summary = {
+        'profile': run['profile'],
+        'load_ms': run['load_ms'],
+        'peak_rss_mb': run['peak_rss_mb'],
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'accuracy': round(accuracy(labels, probabilities), 3),
+        'auc': round(auc, 3) if auc is not None else None
+    }
+    if baseline:
+        drift = [abs(p - b) for p, b in zip(probabilities, baseline)]
+        summary['mean_abs_drift'] = round(sum(drift) / len(drift), 2)
+        summary['max_abs_drift'] = round(max(drift), 2)
+        summary['decision_agreement'] = round(sum(
+            1 for p, b in zip(probabilities, baseline) if (p >= 50) == (b >= 50)
+        ) / len(drift), 3)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare CPU inference profiles over the labeled training data')
+    parser.add_argument('--csv', default=TRAINING_CSV, help='labeled examples (id,text,label,...)')
+    parser.add_argument('--profiles', default=','.join(INFERENCE_PROFILES),
+                        help='comma separated profiles to compare (the full baseline is always run)')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N examples')
+    parser.add_argument('--run-profile', choices=list(INFERENCE_PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.run_profile:
+        print(json.dumps(run_profile(args.run_profile, args.csv, args.limit)))
+        return
+    
+    examples = load_examples(args.csv, args.limit)
+    if not examples:
+        print(json.dumps({'error': f'No labeled examples found in {args.csv}'}))
+        sys.exit(1)
+    labels = [example['label'] for example in examples]
+    
+    profiles = ['full'] + [p for p in args.profiles.split(',') if p and p != 'full']
+    runs = [spawn_profile(profile, args) for profile in profiles]
+    baseline = runs[0].get('probabilities')
+    
+    report = {
+        'documents': len(examples),
+        'baseline': 'full',
+        'profiles': [summarize(run, labels, baseline) for run in runs]
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
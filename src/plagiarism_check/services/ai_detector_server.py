@@ -0,0 +1,324 @@
+"""Asyncio front end that micro-batches concurrent detection requests
+
+Requests use the --worker line protocol (one JSON object per line, optional
+`id`, `type` of `detect`, `health` or `metrics`) over a Unix socket or a
+loopback TCP port. Requests arriving within --max-wait-ms of the first queued
+one, up to --max-batch-tokens, go through one detect_many call, so their GPT-2
+windows and MiniLM sentences share forward passes. Detector options are the
+same as ai_detector.py's:
+
+    python ai_detector_server.py --socket /tmp/ai-detector.sock --max-wait-ms 10 --mode full
+"""
+import os
+import sys
+import time
+import json
+import signal
+import asyncio
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_detector
+from ai_detector import log, LOG_ERROR, LOG_INFO, LOG_DEBUG, validate_request, build_detector, startup_time
+from ai_detector_eval import percentile
+
+MAX_WAIT_MS = float(os.environ.get('AI_DETECTOR_SERVER_MAX_WAIT_MS', '10'))
+MAX_BATCH_TOKENS = int(os.environ.get('AI_DETECTOR_SERVER_MAX_BATCH_TOKENS', '8192'))
+MAX_QUEUE = int(os.environ.get('AI_DETECTOR_SERVER_MAX_QUEUE', '256'))  # queued requests before replying busy
+
+CHARS_PER_TOKEN = 4  # rough GPT-2 ratio for English, used for the batch token budget
+RECENT_SAMPLES = 1000  # queue waits / batch sizes kept for the metrics percentiles
+
+class QueueFull(Exception):
+    """The request queue is at --max-queue; the client should retry later"""
+
+class PendingRequest:
+    """One queued detect request and the future its reply is delivered through"""
+    __slots__ = ('text', 'mode', 'tokens', 'future', 'queued_at')
+    
+    def __init__(self, text, mode, future):
+        self.text = text
+        self.mode = mode
+        self.tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+class MicroBatcher:
+    """Collects queued requests into batches and runs them on one detector thread
+    
+    A batch closes when --max-wait-ms has passed since its first request or the
+    next request would push it over --max-batch-tokens. Model work runs on a
+    single executor thread so the event loop keeps accepting requests (and
+    filling the next batch) while a batch is being scored.
+    """
+    
+    def __init__(self, detector, max_wait_ms=MAX_WAIT_MS, max_batch_tokens=MAX_BATCH_TOKENS, max_queue=MAX_QUEUE):
+        self.detector = detector
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_tokens = max_batch_tokens
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detector')
+        self.started = time.time()
+        self.counts = Counter()
+        self.batch_size_histogram = Counter()
+        self.max_queue_depth = 0
+        self.recent_waits = deque(maxlen=RECENT_SAMPLES)
+        self.recent_batch_ms = deque(maxlen=RECENT_SAMPLES)
+        self.recent_batch_tokens = deque(maxlen=RECENT_SAMPLES)
+    
+    def submit(self, text, mode):
+        """Queue a request and return the future of its (result, batch info); raises QueueFull"""
+        if len(self.queue) >= self.max_queue:
+            self.counts['rejected'] += 1
+            raise QueueFull(f'Server busy: {len(self.queue)} requests queued')
+        
+        request = PendingRequest(text, mode, asyncio.get_running_loop().create_future())
+        self.queue.append(request)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+        self.ready.set()
+        return request.future
+    
+    async def next_batch(self):
+        """Wait for a request, then gather more until the wait window or token budget is used up"""
+        while not self.queue:
+            self.ready.clear()
+            await self.ready.wait()
+        
+        batch = [self.queue.popleft()]
+        tokens = batch[0].tokens
+        # The window opens when the first request was queued, not when it is dequeued:
+        # requests that queued behind a running batch should not wait another full window
+        deadline = batch[0].queued_at + self.max_wait
+        while True:
+            if self.queue:
+                if tokens + self.queue[0].tokens > self.max_batch_tokens:
+                    break  # left for the next batch
+                request = self.queue.popleft()
+                batch.append(request)
+                tokens += request.tokens
+                continue
+            
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return batch, tokens
+    
+    async def run(self):
+        """Batching loop: score one batch at a time, forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch, tokens = await self.next_batch()
+            started = time.perf_counter()
+            for request in batch:
+                self.recent_waits.append((started - request.queued_at) * 1000)
+            
+            # One detect_many call per mode present in the batch
+            by_mode = {}
+            for request in batch:
+                by_mode.setdefault(request.mode, []).append(request)
+            for mode, requests in by_mode.items():
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, self.detector.detect_many, [request.text for request in requests], mode
+                    )
+                except Exception as e:
+                    log(LOG_ERROR, f"💥 Batch of {len(requests)} failed: {str(e)}")
+                    self.counts['errors'] += len(requests)
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+                    continue
+                
+                for request, result in zip(requests, results):
+                    if not request.future.done():  # the client may have gone away
+                        request.future.set_result((result, {
+                            'size': len(batch),
+                            'tokens': tokens,
+                            'queue_ms': round((started - request.queued_at) * 1000, 3)
+                        }))
+            
+            batch_ms = (time.perf_counter() - started) * 1000
+            self.counts['requests'] += len(batch)
+            self.counts['batches'] += 1
+            self.batch_size_histogram[len(batch)] += 1
+            self.recent_batch_ms.append(batch_ms)
+            self.recent_batch_tokens.append(tokens)
+            log(LOG_DEBUG, "📦 Batch of %d requests (%d tokens) in %.1f ms", len(batch), tokens, batch_ms)
+    
+    def metrics(self):
+        """Queue depth, batch size and latency figures for tuning the wait window and token budget"""
+        waits = list(self.recent_waits)
+        batch_ms = list(self.recent_batch_ms)
+        return {
+            'queue_depth': len(self.queue),
+            'max_queue_depth': self.max_queue_depth,
+            'requests': self.counts['requests'],
+            'batches': self.counts['batches'],
+            'rejected': self.counts['rejected'],
+            'errors': self.counts['errors'],
+            'mean_batch_size': round(self.counts['requests'] / self.counts['batches'], 2) if self.counts['batches'] else None,
+            'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_size_histogram.items())},
+            'mean_batch_tokens': round(sum(self.recent_batch_tokens) / len(self.recent_batch_tokens), 1)
+                                 if self.recent_batch_tokens else None,
+            'queue_wait_ms': latency_summary(waits),
+            'batch_ms': latency_summary(batch_ms),
+            'settings': {
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch_tokens': self.max_batch_tokens,
+                'max_queue': self.max_queue
+            },
+            'uptime': int((time.time() - self.started) * 1000)
+        }
+
+def latency_summary(values):
+    """p50/p95/p99 of recent millisecond timings, None before the first batch"""
+    if not values:
+        return None
+    return {f'p{q}': round(percentile(values, q), 3) for q in (50, 95, 99)}
+
+async def answer_detect(batcher, writer, data, request_id):
+    """Queue one detect request and write its reply line when its batch is done"""
+    try:
+        text = validate_request(data)
+        result, batch = await batcher.submit(text, data.get('mode'))
+        reply = {'id': request_id, 'type': 'result', 'result': result, 'batch': batch}
+    except QueueFull as e:
+        reply = {'id': request_id, 'type': 'error', 'error': str(e), 'busy': True}
+    except Exception as e:
+        log(LOG_ERROR, f"💥 Request {request_id} failed: {str(e)}")
+        reply = {'id': request_id, 'type': 'error', 'error': f'Processing failed: {str(e)}'}
+    write_line(writer, reply)
+
+def write_line(writer, message):
+    if not writer.is_closing():
+        writer.write((json.dumps(message) + '\n').encode('utf-8'))
+
+async def serve_client(batcher, reader, writer):
+    """Read request lines from one connection; replies come back as their batches finish"""
+    pending = set()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break  # client closed its side
+            
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                write_line(writer, {'id': None, 'type': 'error', 'error': f'Invalid JSON: {e}'})
+                continue
+            
+            request_id = data.get('id') if isinstance(data, dict) else None
+            request_type = data.get('type', 'detect') if isinstance(data, dict) else 'detect'
+            if request_type == 'metrics':
+                write_line(writer, {'id': request_id, 'type': 'metrics', **batcher.metrics()})
+            elif request_type == 'health':
+                write_line(writer, {
+                    'id': request_id,
+                    'type': 'health',
+                    'status': 'ok',
+                    'pid': os.getpid(),
+                    'neural_ready': batcher.detector.neural_ready,
+                    'queue_depth': len(batcher.queue)
+                })
+            else:
+                task = asyncio.create_task(answer_detect(batcher, writer, data, request_id))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            
+            # Stop reading while the client is not draining its replies
+            await writer.drain()
+        
+        if pending:
+            await asyncio.gather(*pending)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(args, detector_args):
+    detector = build_detector(detector_args)
+    batcher = MicroBatcher(detector, args.max_wait_ms, args.max_batch_tokens, args.max_queue)
+    batch_loop = asyncio.create_task(batcher.run())
+    
+    def handle(reader, writer):
+        return serve_client(batcher, reader, writer)
+    
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = await asyncio.start_unix_server(handle, path=args.socket)
+        address = args.socket
+    else:
+        server = await asyncio.start_server(handle, host='127.0.0.1', port=args.port)
+        address = f'127.0.0.1:{args.port}'
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    
+    log(LOG_INFO, f"📡 Micro-batching server on {address} (wait {args.max_wait_ms} ms, "
+                  f"{args.max_batch_tokens} tokens, queue {args.max_queue})")
+    print(json.dumps({
+        'type': 'ready',
+        'pid': os.getpid(),
+        'address': address,
+        'mode': detector.mode,
+        'neural_ready': detector.neural_ready,
+        'startup_time': startup_time()
+    }), flush=True)
+    
+    async with server:
+        await stop.wait()
+    
+    batch_loop.cancel()
+    batcher.executor.shutdown(wait=True)
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+    log(LOG_INFO, f"👋 Server shutting down after {batcher.counts['requests']} requests")
+
+def parse_args(argv=None):
+    """Server options; everything else is passed on to ai_detector.parse_args"""
+    parser = argparse.ArgumentParser(description='Micro-batching front end for the hybrid AI text detector',
+                                     epilog='Other options (--mode, --batch-size, ...) configure the detector.')
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument('--socket', help='Unix socket path to listen on')
+    listen.add_argument('--port', type=int, help='loopback TCP port to listen on')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help=f'longest a request waits for others to share its batch (default: {MAX_WAIT_MS})')
+    parser.add_argument('--max-batch-tokens', type=int, default=MAX_BATCH_TOKENS,
+                        help=f'estimated GPT-2 tokens per batch (default: {MAX_BATCH_TOKENS})')
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE,
+                        help=f'queued requests before new ones are answered busy (default: {MAX_QUEUE})')
+    args, detector_argv = parser.parse_known_args(argv)
+    return args, ai_detector.parse_args(detector_argv)
+
+def main():
+    args, detector_args = parse_args()
+    if detector_args.quiet:
+        ai_detector.VERBOSITY = LOG_ERROR
+    elif detector_args.verbosity is not None:
+        ai_detector.VERBOSITY = detector_args.verbosity
+    
+    try:
+        asyncio.run(serve(args, detector_args))
+    except Exception as e:
+        log(LOG_ERROR, f"💥 Critical error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Regression checks for edge cases of the hybrid AI detector
+
+Each check prints one ✅/❌ line per case; the exit status is 1 if any failed:
+
+    python src/test/verify_ai_detector.py
+"""
+import os
+import re
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'plagiarism_check', 'services'))
+from ai_detector import HybridNeuralAIDetector, PhraseMatcher
+
+EMPTY_TEXTS = ('   ', '\n\n\n\n', '!!!???')
+
+SAMPLE_TEXTS = (
+    "Artificial intelligence has transformed many industries in recent years. Companies now rely on "
+    "machine learning models to automate decisions. These systems require careful evaluation to avoid bias.",
+    "I walked to the market on Sunday and the stalls were nearly empty. The fish guy was out sick, "
+    "so I bought bread instead. My sister laughed when I came home with three loaves."
+)
+
+# Self-overlapping and nested phrases the built-in lists do not have (yet)
+ADVERSARIAL_PHRASES = ['a', 'a a', 'a a a', 'ab', 'ab ab', 'b a b', 'in', 'in addition', 'addition to', 'to a']
+FUZZ_WORDS = ['a', 'b', 'ab', 'in', 'addition', 'to', ',', '.', 'is']
+
+class FailingEncoder:
+    """Stands in for the sentence model when checking the embedding failure path"""
+    def encode(self, *args, **kwargs):
+        raise RuntimeError('encoder unavailable')
+
+def check_empty_stream(detector):
+    """Streaming a text without words ends in a result in every mode, as detect() does"""
+    checks = []
+    for mode in ('cascade', 'full', 'fast'):
+        for text in EMPTY_TEXTS:
+            label = f"stream {mode} {text!r}"
+            try:
+                messages = list(detector.detect_stream(text, mode))
+                ok = messages[-1]['type'] == 'result' and 'probability' in messages[-1]['result']
+            except Exception as e:
+                ok = False
+                label += f": {e}"
+            checks.append((ok, label))
+    return checks
+
+def findall_counts(phrase_lists, text_lower):
+    """Reference counts: one `\\bphrase\\b` findall per phrase, as the detector used to do"""
+    phrases = {phrase for group in phrase_lists.values() for phrase in group}
+    return {phrase: len(re.findall(r'\b' + re.escape(phrase) + r'\b', text_lower)) for phrase in phrases}
+
+def check_phrase_counts(detector, rounds=2000):
+    """PhraseMatcher counts equal per-phrase findall counts, for the real lists and adversarial ones"""
+    rng = random.Random(0)
+    real = {'ai_phrases': detector.ai_phrases, 'transitions': detector.transition_phrases}
+    real_texts = [text.lower() for text in SAMPLE_TEXTS] + [
+        ' '.join(rng.choice(detector.ai_phrases + detector.transition_phrases + FUZZ_WORDS) for _ in range(60))
+        for _ in range(rounds // 10)
+    ]
+    
+    checks = []
+    for name, phrase_lists, texts in (
+        ('real lists', real, real_texts),
+        ('adversarial phrases', {'adversarial': ADVERSARIAL_PHRASES}, None),
+        ('real + adversarial', {**real, 'adversarial': ADVERSARIAL_PHRASES}, real_texts)
+    ):
+        matcher = PhraseMatcher(phrase_lists)
+        if texts is None:
+            texts = [' '.join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(1, 30))) for _ in range(rounds)]
+        mismatches = []
+        for text in texts:
+            counts = matcher.count(text)
+            expected = findall_counts(phrase_lists, text)
+            if any(counts[phrase] != count for phrase, count in expected.items()):
+                mismatches.append(text)
+        label = f"phrase counts ({name}) match findall over {len(texts)} texts"
+        checks.append((not mismatches, label + (f": first mismatch {mismatches[0]!r}" if mismatches else '')))
+    return checks
+
+def check_embedding_failure(detector):
+    """A failed sentence encode leaves every document in a batch with the neutral embedding scores"""
+    if not detector.neural_ready:
+        return [(True, 'embedding failure: neural models unavailable, skipped')]
+    
+    model = detector.sentence_model
+    detector.sentence_model = FailingEncoder()
+    try:
+        batch = detector.detect_many(list(SAMPLE_TEXTS), 'full')
+        single = [detector.detect_many([text], 'full')[0] for text in SAMPLE_TEXTS]
+    finally:
+        detector.sentence_model = model
+    
+    checks = []
+    for index, (batched, alone) in enumerate(zip(batch, single)):
+        neural = batched['breakdown']['neural_breakdown']
+        checks.append((
+            'coherence' in batched['breakdown']['stages_run']
+            and neural['coherence_score'] == 50 and neural['embedding_score'] == 50,
+            f"embedding failure: document {index} keeps neutral coherence/embedding scores"
+        ))
+        checks.append((
+            batched['probability'] == alone['probability'],
+            f"embedding failure: document {index} scores the same in a batch as alone"
+        ))
+    return checks
+
+def main():
+    detector = HybridNeuralAIDetector(use_cache=False, sentence_cache_bytes=0)
+    checks = check_phrase_counts(detector) + check_empty_stream(detector) + check_embedding_failure(detector)
+    for ok, message in checks:
+        print(f"{'✅' if ok else '❌'} {message}")
+    if not all(ok for ok, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
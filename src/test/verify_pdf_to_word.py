@@ -0,0 +1,58 @@
+"""Check that parallel PDF to Word conversion matches a serial run on a long document
+
+Builds a PDF with more pages than pdf2docx's 100 placeholder pages, converts
+it with one worker and with several, and compares the text of both DOCX files:
+
+    python src/test/verify_pdf_to_word.py --pages 120 --workers 2
+"""
+import io
+import os
+import sys
+import argparse
+
+import fitz
+from docx import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'file_converter'))
+from pdf_to_word import convert
+
+def build_pdf(pages):
+    """PDF bytes with one numbered paragraph per page"""
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {number}: the quick brown fox jumps over the lazy dog.")
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+def docx_text(pdf_bytes, workers):
+    """Paragraph texts of the DOCX converted with the given worker count"""
+    output = io.BytesIO()
+    report = convert(pdf_bytes, output, workers=workers)
+    output.seek(0)
+    return [p.text for p in Document(output).paragraphs if p.text.strip()], report
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare parallel and serial pdf_to_word conversions')
+    parser.add_argument('--pages', type=int, default=120, help='pages in the generated PDF (default: 120)')
+    parser.add_argument('--workers', type=int, default=2, help='workers for the parallel run (default: 2)')
+    args = parser.parse_args()
+
+    pdf_bytes = build_pdf(args.pages)
+    serial, _ = docx_text(pdf_bytes, 1)
+    parallel, report = docx_text(pdf_bytes, args.workers)
+
+    checks = [
+        (report['workers'] == args.workers, f"ran with {report['workers']} workers"),
+        (len(parallel) == args.pages, f"{len(parallel)} of {args.pages} pages converted"),
+        (parallel == serial, 'text matches the serial conversion')
+    ]
+    for ok, message in checks:
+        print(f"{'✅' if ok else '❌'} {message}")
+    if not all(ok for ok, _ in checks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()